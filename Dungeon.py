@@ -1,18 +1,43 @@
+import time
+_IMPORT_T0 = time.perf_counter()  # 起動時間の計測（--startup-timing）の起点
 import os
 import random
 import math
+import json
+import argparse
+import hashlib
+import zlib
+import csv
+import heapq
+import mmap
+import struct
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import repeat
 import pygame as pg
 
+try:
+    import numpy as np  # あれば高速化に使う（無くても動く）
+except ImportError:
+    np = None
+
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 WIDTH = 1100
 HEIGHT = 650
-FPS = 60
+FPS = 60             # シミュレーションの1秒あたりのステップ数（動きの量はすべて1ステップ単位）
+RENDER_FPS = 144     # 描画の上限（0 なら制限なし。シミュレーションは FPS のまま補間して描く）
+MAX_CATCHUP_STEPS = 5  # 止まった後に1回の描画の前に追いつきで回すステップ数の上限
+LERP_SNAP_PX = 64    # 1ステップでこれ以上動いたもの（ワープ・出直し）は補間せずそのまま描く
 BEAM_IMG_OFFSET_DEG = 0
 ARROW_IMG_OFFSET_DEG = -45
 
 DEBUG_DRAW_GROUND_LINE = True
 
+# 起動をまたいで使い回す計算結果の保存先
+CACHE_DIR = ".cache"
+
 # =====================
 # 初期値設定
 # =====================
@@ -41,18 +66,89 @@ FINAL_TRANSITION_FRAMES = POPUP_FRAMES
 FINAL_BOSS_SCORE = 1500
 FINAL_BOSS_HP = 3000
 
-# アイテムスポーン間隔(フレーム) と スポーン確率
-ITEM_SPAWN_INTERVAL_STAGE1 = 90   # 1.5秒(60FPS想定)
-ITEM_SPAWN_INTERVAL_STAGE2 = 70
-ITEM_SPAWN_PROB_STAGE1 = 0.55
-ITEM_SPAWN_PROB_STAGE2 = 0.65
+MIDBOSS_SCORE = 250  # これを超えたら中ボス出現
+
+# 敵・アイテムの出現とボスの攻撃の予定表（間隔・確率はここで調整する）
+STAGE_FILE = "stages.json"
 
 
 # =========================
 # 共通関数
 # =========================
+FONT_NAME = "meiryo"
+FONT_CACHE_FILE = os.path.join(CACHE_DIR, "font_path.json")
+_FONT_CACHE: dict[int, pg.font.Font] = {}
+_FONT_PATH: str | None = None  # 解決済みのフォントファイル（"" は見つからず pygame の既定フォント）
+
+def resolve_font_path(name: str = FONT_NAME) -> str:
+    """
+    フォント名をフォントファイルのパスにする（見つからなければ "" = pygame の既定フォント）。
+
+    名前からの検索（SysFont / match_font）はシステムのフォントを全部調べるので重い。
+    結果を FONT_CACHE_FILE に保存し、次回からはそのファイルが残っているかを見るだけにする。
+    （フォントを入れ直して検索し直したいときはキャッシュファイルを消す）
+    """
+    global _FONT_PATH
+    if _FONT_PATH is not None and name == FONT_NAME:
+        return _FONT_PATH
+    cache = _load_json_cache(FONT_CACHE_FILE)
+    path = cache.get(name)
+    if not isinstance(path, str) or (path and not os.path.isfile(path)):
+        path = pg.font.match_font(name) or ""
+        cache[name] = path
+        _save_json_cache(FONT_CACHE_FILE, cache)
+    if name == FONT_NAME:
+        _FONT_PATH = path
+    return path
+
 def load_font(size):
-    return pg.font.SysFont("meiryo", size)
+    """
+    サイズごとに1回だけフォントを作って使い回す（ファイルは resolve_font_path で1回だけ探す）。
+    """
+    font = _FONT_CACHE.get(size)
+    if font is None:
+        font = pg.font.Font(resolve_font_path() or None, size)
+        _FONT_CACHE[size] = font
+    return font
+
+# 文字列描画結果のLRUキャッシュ
+# キー: (フォント名, サイズ, 文字列, 色, アンチエイリアス)
+TEXT_CACHE_MAX = 256
+_TEXT_CACHE: "OrderedDict[tuple, pg.Surface]" = OrderedDict()
+_TEXT_STATS = {"hit": 0, "miss": 0}
+
+def render_text(size: int, text: str, color: tuple[int, int, int], antialias: bool = True) -> pg.Surface:
+    """
+    load_font(size) で text を描画した Surface を返す（LRUキャッシュ付き）。
+    同じ文字列を毎フレーム描く画面やHUDでは、2回目以降はラスタライズしない。
+    返した Surface は共有されるので書き換えないこと。
+    """
+    key = (FONT_NAME, size, text, tuple(color), bool(antialias))
+    surf = _TEXT_CACHE.get(key)
+    if surf is not None:
+        _TEXT_STATS["hit"] += 1
+        _TEXT_CACHE.move_to_end(key)
+        return surf
+    _TEXT_STATS["miss"] += 1
+    surf = load_font(size).render(text, antialias, color)
+    _TEXT_CACHE[key] = surf
+    if len(_TEXT_CACHE) > TEXT_CACHE_MAX:
+        _TEXT_CACHE.popitem(last=False)
+    return surf
+
+def get_text_cache_stats() -> dict[str, int | float]:
+    """
+    文字列描画キャッシュのヒット/ミス数とヒット率を返す。
+    """
+    hit = _TEXT_STATS["hit"]
+    miss = _TEXT_STATS["miss"]
+    total = hit + miss
+    return {
+        "hit": hit,
+        "miss": miss,
+        "entries": len(_TEXT_CACHE),
+        "hit_rate": (hit / total) if total else 0.0,
+    }
 
 _IMAGE_CACHE: dict[str, pg.Surface] = {}
 
@@ -64,15 +160,189 @@ def load_image(filename: str) -> pg.Surface:
     candidates = [os.path.join("fig", filename), filename]
     for path in candidates:
         try:
-            img = pg.image.load(path)
-            if pg.display.get_init() and pg.display.get_surface() is not None:
-                img = img.convert_alpha()
-            _IMAGE_CACHE[filename] = img
-            return img
+            return _finish_image(filename, pg.image.load(path))
         except:
             pass
     raise SystemExit(f"画像 {filename} の読み込みに失敗しました")
 
+def _to_display_format(filename: str, img: pg.Surface) -> pg.Surface:
+    """
+    画像を画面のピクセル形式にそろえる（メインスレッドで呼ぶ。画面が無ければそのまま）。
+    """
+    if pg.display.get_init() and pg.display.get_surface() is not None:
+        # JPEG は透過を持たないので、画面と同じ不透明形式にしてアルファ合成を避ける
+        if filename.lower().endswith((".jpg", ".jpeg")):
+            img = img.convert()
+        else:
+            img = img.convert_alpha()
+    return img
+
+def _finish_image(filename: str, img: pg.Surface) -> pg.Surface:
+    """
+    読み込んだ画像を画面のピクセル形式にそろえて _IMAGE_CACHE に入れる（メインスレッドで呼ぶ）。
+    """
+    img = _to_display_format(filename, img)
+    _IMAGE_CACHE[filename] = img
+    return img
+
+# 変換済み（拡大縮小・回転）Surface の2段目キャッシュ
+# キー: (ファイル名, 変換の種類, パラメータ...)
+_DERIVED_CACHE: dict[tuple, pg.Surface] = {}
+_DERIVED_STATS = {"hit": 0, "miss": 0}
+
+# ランダムサイズの隕石などはこの刻みに丸めてキャッシュを効かせる
+SIZE_BUCKET_PX = 10
+
+def quantize_size(size: int, step: int = SIZE_BUCKET_PX) -> int:
+    """
+    サイズ(px)を step 刻みに丸める（最小 step）。
+    """
+    return max(step, int(round(size / step)) * step)
+
+def _get_derived(key: tuple, build) -> pg.Surface:
+    """
+    key に対応する変換済み Surface を返す。無ければ build() で作って保存する。
+    返した Surface は共有されるので、呼び出し側で書き換えないこと（必要なら copy()）。
+    """
+    img = _DERIVED_CACHE.get(key)
+    if img is not None:
+        _DERIVED_STATS["hit"] += 1
+        return img
+    _DERIVED_STATS["miss"] += 1
+    img = build()
+    _DERIVED_CACHE[key] = img
+    return img
+
+def load_scaled(filename: str, size: tuple[int, int]) -> pg.Surface:
+    """
+    画像を size に smoothscale したものを返す（キャッシュ付き）。
+    画質を下げている間（quality("smooth_scale") が False）は速い scale で作ったもの（別のキー）を返す。
+    """
+    size = (int(size[0]), int(size[1]))
+    if quality("smooth_scale"):
+        return _get_derived(
+            (filename, "scale", size),
+            lambda: pg.transform.smoothscale(load_image(filename), size),
+        )
+    return _get_derived(
+        (filename, "scale_fast", size),
+        lambda: pg.transform.scale(load_image(filename), size),
+    )
+
+def load_rotozoom(filename: str, angle: float, scale: float) -> pg.Surface:
+    """
+    画像を rotozoom(angle, scale) したものを返す（キャッシュ付き）。
+    """
+    return _get_derived(
+        (filename, "rotozoom", float(angle), float(scale)),
+        lambda: pg.transform.rotozoom(load_image(filename), angle, scale),
+    )
+
+def get_derived_cache_stats() -> dict[str, int | float]:
+    """
+    変換済みSurfaceキャッシュのヒット/ミス数とヒット率を返す。
+    """
+    hit = _DERIVED_STATS["hit"]
+    miss = _DERIVED_STATS["miss"]
+    total = hit + miss
+    return {
+        "hit": hit,
+        "miss": miss,
+        "entries": len(_DERIVED_CACHE),
+        "hit_rate": (hit / total) if total else 0.0,
+    }
+
+# =========================
+# スプライトの使い回し（オブジェクトプール）
+# =========================
+class SpritePool:
+    """
+    短命なスプライト（弾・隕石・敵・爆発）を捨てずに取っておき、次の acquire で使い回す。
+
+    - acquire(*args) は空きがあれば reset(*args) して返し、無ければ新しく作る
+    - kill() や Group.empty() でどのグループにも属さなくなったものは、
+      空きが無くなったときにまとめて回収する（release() で明示的に返してもよい）
+    - high_water（同時に貸し出した最大数）と reused（使い回した回数）を数える
+    """
+    def __init__(self, cls):
+        self._cls = cls
+        self._free: list[pg.sprite.Sprite] = []
+        self._live: dict[pg.sprite.Sprite, None] = {}
+        self.created = 0
+        self.reused = 0
+        self.high_water = 0
+        _POOLS.append(self)
+
+    def acquire(self, *args, **kwargs) -> pg.sprite.Sprite:
+        if not self._free:
+            self._reclaim()
+        if self._free:
+            spr = self._free.pop()
+            spr.reset(*args, **kwargs)
+            self.reused += 1
+        else:
+            spr = self._cls(*args, **kwargs)
+            self.created += 1
+        self._live[spr] = None
+        if len(self._live) > self.high_water:
+            self.high_water = len(self._live)
+        return spr
+
+    def release(self, spr: pg.sprite.Sprite) -> None:
+        spr.kill()
+        if self._live.pop(spr, 0) is None:
+            self._free.append(spr)
+
+    def _reclaim(self) -> None:
+        dead = [spr for spr in self._live if not spr.alive()]
+        for spr in dead:
+            del self._live[spr]
+        self._free.extend(dead)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "live": len(self._live),
+            "free": len(self._free),
+            "high_water": self.high_water,
+            "created": self.created,
+            "reused": self.reused,
+        }
+
+_POOLS: list[SpritePool] = []
+
+def get_pool_stats() -> dict[str, dict[str, int]]:
+    """
+    クラス名 -> プールの統計（live / free / high_water / created / reused）。
+    """
+    return {p._cls.__name__: p.stats() for p in _POOLS}
+
+class PooledSprite(pg.sprite.Sprite):
+    """
+    reset() で状態を入れ直して使い回せるスプライト。クラスごとに SpritePool を1つ持つ。
+
+    生成は Cls.acquire(...)（引数は __init__ と同じ）。画像は変換済みSurfaceキャッシュから
+    引くだけなので、使い回しのときに Surface を作り直すことはない。
+    サブクラスは reset(...) を定義すること（新しく作るときも使い回すときも acquire の引数で呼ばれる）。
+    """
+    _pool: SpritePool | None = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.reset(*args, **kwargs)
+
+    @classmethod
+    def pool(cls) -> SpritePool:
+        if cls.__dict__.get("_pool") is None:
+            cls._pool = SpritePool(cls)
+        return cls._pool
+
+    @classmethod
+    def acquire(cls, *args, **kwargs):
+        return cls.pool().acquire(*args, **kwargs)
+
+    def release(self) -> None:
+        type(self).pool().release(self)
+
 # =====================
 # 画面描画(担当：江隈)
 # =====================
@@ -83,20 +353,18 @@ def draw_start_screen(screen):
     """
     screen.fill((0, 0, 0)) # 背景を黒で塗りつぶして前フレームの残像を消す
 
-    # フォント（サイズは固定：タイトル/案内/本文）
-    title_font = load_font(80)
-    sub_font = load_font(40)
-    body_font = load_font(24)
+    # フォントサイズ（固定：タイトル/案内/本文）
+    title_size, sub_size, body_size = 80, 40, 24
 
     # --- タイトル ---
     # 画面上部に固定配置（タイトルは中央寄せ）
-    title = title_font.render("こうかとんダンジョン", True, (255, 255, 255))
+    title = render_text(title_size, "こうかとんダンジョン", (255, 255, 255))
     title_rect = title.get_rect(center=(WIDTH // 2, 110))
     screen.blit(title, title_rect)
 
     # --- スタート案内 ---
     # ENTERで開始することを示す（タイトル直下に中央寄せ）
-    start = sub_font.render("ENTERでスタート", True, (200, 200, 200))
+    start = render_text(sub_size, "ENTERでスタート", (200, 200, 200))
     start_rect = start.get_rect(center=(WIDTH // 2, 200))
     screen.blit(start, start_rect)
 
@@ -120,13 +388,38 @@ def draw_start_screen(screen):
     top_y = 260
 
     # もし行数が増えても下からはみ出しにくいように最大開始位置を制限
-    total_h = (len(lines) - 1) * line_gap + body_font.get_height()
+    total_h = (len(lines) - 1) * line_gap + load_font(body_size).get_height()
     max_top_y = HEIGHT - 20 - total_h
     y = min(top_y, max_top_y)
 
     # 行ごとに描画（左寄せ＋一定間隔）
     for i, line in enumerate(lines):
-        screen.blit(body_font.render(line, True, (255, 255, 255)), (x, y + i * line_gap))
+        screen.blit(render_text(body_size, line, (255, 255, 255)), (x, y + i * line_gap))
+
+def draw_loading_bar(screen, progress: float):
+    """
+    スタート画面の案内の位置に、画像の読み込み状況（0.0〜1.0）をバーで重ねる。
+    """
+    area = pg.Rect(0, 0, 420, 18)
+    area.center = (WIDTH // 2, 200)
+    pg.draw.rect(screen, (0, 0, 0), area.inflate(240, 40))  # 「ENTERでスタート」を隠す
+    pg.draw.rect(screen, (90, 90, 90), area, 2)
+    fill = area.inflate(-6, -6)
+    fill.width = int(fill.width * max(0.0, min(1.0, progress)))
+    pg.draw.rect(screen, (200, 200, 200), fill)
+    label = render_text(20, f"読み込み中… {int(progress * 100)}%", (200, 200, 200))
+    screen.blit(label, label.get_rect(midtop=(WIDTH // 2, area.bottom + 6)))
+
+def draw_ground_line(screen):
+    """
+    デバッグ用：地面の高さを線で描く（平らなら1本の直線、段差・坂があれば折れ線）。
+    """
+    prof = ground_profile()
+    if min(prof) == max(prof):
+        pg.draw.line(screen, (0, 0, 0), (0, prof[0]), (WIDTH, prof[0]), 2)
+    else:
+        pts = [(x, prof[x]) for x in range(0, WIDTH, 4)] + [(WIDTH - 1, prof[-1])]
+        pg.draw.lines(screen, (0, 0, 0), False, pts, 2)
 
 def draw_to_final_screen(screen):
     """
@@ -134,12 +427,11 @@ def draw_to_final_screen(screen):
     """
     screen.fill((0, 0, 0)) # 背景を黒で塗りつぶし、前フレームの描画をリセットする
 
-    # フォント（サイズは固定：タイトル/本文）
-    title_font = load_font(80)
-    body_font = load_font(28)
+    # フォントサイズ（固定：タイトル/本文）
+    title_size, body_size = 80, 28
 
     # --- タイトルは上寄せ（中央に置かない） ---
-    title = title_font.render("最終ステージへ", True, (255, 255, 0))
+    title = render_text(title_size, "最終ステージへ", (255, 255, 0))
     title_rect = title.get_rect(center=(WIDTH // 2, 150))
     screen.blit(title, title_rect)
 
@@ -156,7 +448,7 @@ def draw_to_final_screen(screen):
     # タイトルの“下端 + 余白”から本文開始
     y = title_rect.bottom + 40
     for i, line in enumerate(lines):
-        screen.blit(body_font.render(line, True, (255, 255, 255)), (x, y + i * line_gap))
+        screen.blit(render_text(body_size, line, (255, 255, 255)), (x, y + i * line_gap))
 
 def draw_clear_screen(screen, score: int):
     """
@@ -164,11 +456,10 @@ def draw_clear_screen(screen, score: int):
     """
     screen.fill((0, 0, 0)) # 背景を黒で塗りつぶし、前フレームの描画を消す
 
-    title_font = load_font(80)
-    score_font = load_font(40)
+    title_size, score_size = 80, 40
 
-    title = title_font.render("CLEAR", True, (0, 255, 0))
-    score_surf = score_font.render(f"Score: {score}", True, (255, 255, 255))
+    title = render_text(title_size, "CLEAR", (0, 255, 0))
+    score_surf = render_text(score_size, f"Score: {score}", (255, 255, 255))
 
     # 高さを測って“被らない間隔”で縦に並べる
     gap = 30
@@ -187,11 +478,10 @@ def draw_gameover_screen(screen, score: int):
     """
     screen.fill((0, 0, 0)) # 背景を黒で塗りつぶし、前フレームの描画を消す
 
-    title_font = load_font(80)
-    score_font = load_font(40)
+    title_size, score_size = 80, 40
 
-    title = title_font.render("GAME OVER", True, (255, 0, 0))
-    score_surf = score_font.render(f"Score: {score}", True, (255, 255, 255))
+    title = render_text(title_size, "GAME OVER", (255, 0, 0))
+    score_surf = render_text(score_size, f"Score: {score}", (255, 255, 255))
 
     gap = 30
     total_h = title.get_height() + gap + score_surf.get_height()
@@ -217,50 +507,154 @@ def clamp_in_screen(rect: pg.Rect) -> pg.Rect:
     rect.bottom = min(HEIGHT, rect.bottom)
     return rect
 
-def get_ground_y() -> int:
+# 画面の列ごとの地面の高さ（背景1枚ぶん = WIDTH 列。背景と一緒にスクロールする）
+_GROUND_COLS: list[int] = [GROUND_Y] * WIDTH
+_GROUND_SCROLL = 0  # 背景のスクロール量（画面の x 列は _GROUND_COLS[(x + _GROUND_SCROLL) % WIDTH]）
+
+def get_ground_y(x: float | None = None) -> int:
     """
     現在のステージにおける「地面のY座標」を返す。
 
-    このプログラムでは地面の高さが固定ではなく、
-    Background() を読み込むたびに detect_ground_y() で推定して GROUND_Y を更新する。
+    x を渡すと、画面のその列の地面の高さ（ハイトマップを1回引くだけ）。
+    x を省くと、ステージの代表の高さ（平らなステージでは全列この値）。
+    このプログラムでは地面の高さが固定ではなく、Background を切り替えるたびに更新する。
     """
-    return GROUND_Y
+    if x is None:
+        return GROUND_Y
+    return _GROUND_COLS[(int(x) + _GROUND_SCROLL) % WIDTH]
 
-def set_ground_y(v: int) -> None:
+def set_ground_y(v: int, cols: list[int] | None = None) -> None:
     """
-    地面のY座標（GROUND_Y）を更新する。
+    地面のY座標（GROUND_Y）と列ごとの高さを更新する（cols を省くと全列 v の平らな地面）。
     """
-    global GROUND_Y
+    global GROUND_Y, _GROUND_COLS
     GROUND_Y = v
+    _GROUND_COLS = list(cols) if cols is not None else [v] * WIDTH
+
+def set_ground_scroll(offset: int) -> None:
+    """
+    背景のスクロール量をハイトマップに反映する（Background.update から呼ぶ）。
+    """
+    global _GROUND_SCROLL
+    _GROUND_SCROLL = offset
+
+def ground_profile() -> list[int]:
+    """
+    今の画面の x = 0..WIDTH-1 の地面の高さ（デバッグ描画用）。
+    """
+    k = _GROUND_SCROLL % WIDTH
+    return _GROUND_COLS[k:] + _GROUND_COLS[:k]
+
+_STAGE_DATA: dict = {}
 
-def stage_params(stage: int) -> dict[str, int | str]:
+def load_stage_file(path: str = STAGE_FILE) -> dict:
     """
-    ステージごとの設定
+    ステージファイル（JSON。拡張子が .toml なら TOML）を読んで返す（1回だけ読む）。
+    """
+    data = _STAGE_DATA.get(path)
+    if data is None:
+        if path.endswith(".toml"):
+            try:
+                import tomllib
+            except ImportError:  # tomllib は Python 3.11 から
+                raise SystemExit(f"TOML のステージファイル {path} を読むには Python 3.11 以上が必要です"
+                                 "（3.10 では JSON を使ってください）")
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        _STAGE_DATA[path] = data
+    return data
+
+def stage_params(stage: int) -> dict:
+    """
+    ステージごとの設定（ステージファイルの "stages" の項目。毎回同じ dict を返すので書き換えないこと）
 
      Returns:
-        dict[str, int | str]:
+        dict:
             "bg_file" (str): 背景画像ファイル名
             "bg_speed" (int): 背景スクロール速度
             "enemy_speed" (int): 敵の移動速度
             "item_speed" (int): アイテムの移動速度
-            "spawn_interval" (int): 敵の生成間隔（フレーム）
+            "timeline" (list[dict]): 敵・アイテム・ボス出現の予定（Timeline のイベント）
     
     """
-    if stage == 1:
-        return {
-            "bg_file": "bg_1.jpg",
-            "bg_speed": 4,
-            "enemy_speed": 5,
-            "item_speed": 5,
-            "spawn_interval": 60,  # フレーム間隔
-        }
-    return {
-        "bg_file": "bg_2.jpg",
-        "bg_speed": 4,
-        "enemy_speed": 5,
-        "item_speed": 7,
-        "spawn_interval": 45,
-    }
+    stages = load_stage_file()["stages"]
+    return stages["1"] if stage == 1 else stages["2"]
+
+def boss_pattern(name: str) -> list[dict]:
+    """
+    ボスの攻撃パターン（ステージファイルの "bosses" の項目。Timeline のイベント）。
+    """
+    return load_stage_file()["bosses"][name]
+
+class Timeline:
+    """
+    周期イベントの予定表。次に起きる時刻の順に heapq で持ち、run(now) では時刻が来たものだけ取り出す。
+
+    イベントは dict（ステージファイルの1項目）:
+    - "event": 名前（fire に渡す）
+    - "every": 周期（フレーム）。時刻が every の倍数（+ "offset"）のフレームで起きる
+    - "prob": 起きる確率（省略時は抽選しない）
+    - "period" と "active": [a, b] … 時刻 % period が a 以上 b 未満の間だけ起きる
+    - "when": 条件名。gate(event) が False の時刻は（抽選もせずに）見送る
+    同じ時刻のイベントは一覧に書いた順に起きる。その時刻に run されなかったイベントは見送りになる。
+    ステージファイルは外部のデータなので、書き方の誤りは作るときに ValueError にする。
+    """
+    def __init__(self, events: list[dict], start: int = 0):
+        for ev in events:
+            self._check(ev)
+        self._heap = [(self._next_time(ev, start), i, ev) for i, ev in enumerate(events)]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def _check(ev: dict) -> None:
+        every = ev.get("every")
+        if not isinstance(every, int) or every < 1:
+            raise ValueError(f"タイムラインのイベント {ev!r}: \"every\" は1以上の整数で書いてください")
+        if ("period" in ev) != ("active" in ev):
+            raise ValueError(f"タイムラインのイベント {ev!r}: \"period\" と \"active\" は両方書いてください")
+        if "period" in ev:
+            period, active = ev["period"], ev["active"]
+            if not isinstance(period, int) or period < 1 or not isinstance(active, list) or len(active) != 2:
+                raise ValueError(f"タイムラインのイベント {ev!r}: \"period\" は1以上の整数、"
+                                 "\"active\" は [a, b] で書いてください")
+
+    @staticmethod
+    def _next_time(ev: dict, start: int) -> int:
+        every = ev["every"]
+        return start + (ev.get("offset", 0) - start) % every
+
+    def run(self, now: int, fire, gate=None) -> int:
+        """
+        now に起きるイベントを順に fire(event, now) する。起きた数を返す。
+        """
+        heap = self._heap
+        fired = 0
+        while heap and heap[0][0] <= now:
+            t, i, ev = heapq.heappop(heap)
+            if t == now:
+                if self._ready(ev, now, gate):
+                    fire(ev, now)
+                    fired += 1
+                t = self._next_time(ev, now + 1)
+            else:
+                t = self._next_time(ev, now)  # 見送った分は飛ばす
+            heapq.heappush(heap, (t, i, ev))
+        return fired
+
+    @staticmethod
+    def _ready(ev: dict, now: int, gate) -> bool:
+        if "period" in ev:
+            a, b = ev["active"]
+            if not a <= now % ev["period"] < b:
+                return False
+        if "when" in ev and not gate(ev):
+            return False
+        if "prob" in ev and not random.random() < ev["prob"]:
+            return False
+        return True
 
 # ========================
 # 敵スポーン関連関数(担当：高柳)
@@ -271,12 +665,14 @@ def spawn_enemy(enemies: pg.sprite.Group, stage: int) -> None:
     """
     params = stage_params(stage)
     kind = random.choice(["ground", "air"])  # 地面敵 / 空中敵
-    enemies.add(Enemy(stage=stage, kind=kind, speed=params["enemy_speed"]))
+    enemies.add(Enemy.acquire(stage=stage, kind=kind, speed=params["enemy_speed"]))
 
 def detect_ground_y(bg_scaled: pg.Surface) -> int:
     """
     リサイズ済み背景から「暗くて横方向に均一な水平ライン」を推定し、
     その“1px下”を地面Yとして返す。
+
+    NumPy があれば行ごとの輝度の平均・標準偏差をまとめて計算する。
     """
     w, h = bg_scaled.get_size()
 
@@ -285,6 +681,18 @@ def detect_ground_y(bg_scaled: pg.Surface) -> int:
 
     x_step = 4
     best_y = int(h * 0.75)
+    if y_end <= y_start:
+        return min(h - 1, best_y + 1)
+
+    if np is not None:
+        rgb = pg.surfarray.array3d(bg_scaled)[::x_step, y_start:y_end, :].astype(np.float64)
+        lum = 0.2126 * rgb[..., 0] + 0.7152 * rgb[..., 1] + 0.0722 * rgb[..., 2]
+        mean = lum.mean(axis=0)
+        var = (lum * lum).mean(axis=0) - mean * mean
+        std = np.sqrt(np.maximum(var, 0.0))
+        best_y = y_start + int(np.argmin(mean + 0.3 * std))
+        return min(h - 1, best_y + 1)
+
     best_score = 10**18
     for y in range(y_start, y_end):
         s = 0.0
@@ -307,6 +715,135 @@ def detect_ground_y(bg_scaled: pg.Surface) -> int:
 
     return min(h - 1, best_y + 1)
 
+# 地面推定結果のディスクキャッシュ（背景ファイルの中身のハッシュで引く）
+GROUND_CACHE_FILE = os.path.join(CACHE_DIR, "ground_y.json")
+GROUND_CACHE_VERSION = 1
+
+def find_asset_path(filename: str) -> str | None:
+    """
+    load_image と同じ探索順で画像ファイルのパスを返す（見つからなければ None）。
+    """
+    for path in (os.path.join("fig", filename), filename):
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _ground_cache_key(bg_file: str, size: tuple[int, int]) -> str | None:
+    path = find_asset_path(bg_file)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return f"v{GROUND_CACHE_VERSION}:{digest}:{size[0]}x{size[1]}"
+
+def _load_json_cache(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_json_cache(path: str, data: dict) -> None:
+    """
+    一時ファイルに書いてから置き換える（途中で落ちても壊れたJSONを残さない）。
+    書けない環境ではキャッシュしないだけで、ゲームは続行する。
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def cached_ground_y(bg_file: str, bg_scaled: pg.Surface) -> int:
+    """
+    detect_ground_y の結果をディスクにキャッシュして返す。
+    同じ背景ファイル（中身が同じ）・同じ画面サイズなら2回目以降は走査しない。
+    """
+    try:
+        key = _ground_cache_key(bg_file, bg_scaled.get_size())
+    except OSError:
+        key = None
+    if key is None:
+        return detect_ground_y(bg_scaled)
+
+    cache = _load_json_cache(GROUND_CACHE_FILE)
+    if isinstance(cache.get(key), int):
+        return cache[key]
+
+    y = detect_ground_y(bg_scaled)
+    cache[key] = y
+    _save_json_cache(GROUND_CACHE_FILE, cache)
+    return y
+
+GROUND_BLOCK_PX = 16  # 列ごとの推定で、まとめて見る列の幅
+
+def detect_ground_heights(bg_scaled: pg.Surface) -> list[int]:
+    """
+    detect_ground_y と同じ基準（暗くて横方向に均一なライン）を GROUND_BLOCK_PX 列ごとに当てはめ、
+    列ごとの地面Yを返す。ブロックの中心の間は線形補間する（背景は横につながるので端は回り込む）。
+    NumPy が無い環境では全列 detect_ground_y の平らな地面にする。
+    """
+    w, h = bg_scaled.get_size()
+    if np is None:
+        return [detect_ground_y(bg_scaled)] * w
+    y_start = int(h * 0.40)
+    y_end = int(h * 0.90)
+    block = GROUND_BLOCK_PX
+    nb = w // block
+    rgb = pg.surfarray.array3d(bg_scaled)[:nb * block, y_start:y_end, :].astype(np.float64)
+    lum = (0.2126 * rgb[..., 0] + 0.7152 * rgb[..., 1] + 0.0722 * rgb[..., 2]).reshape(nb, block, -1)
+    score = lum.mean(axis=1) + 0.3 * lum.std(axis=1)
+    ys = y_start + np.argmin(score, axis=1) + 1
+    ys = np.median(np.stack([np.roll(ys, 1), ys, np.roll(ys, -1)]), axis=0)  # 1ブロックだけの外れを消す
+    centers = np.arange(nb) * block + block / 2
+    cols = np.interp(np.arange(w), centers, ys, period=w)
+    return [min(h - 1, int(round(v))) for v in cols]
+
+def ground_from_points(points: list[list[int]]) -> list[int]:
+    """
+    ステージファイルで書いた [[x, y], ...]（背景1枚ぶん、x は 0..WIDTH）を列ごとの高さにする。
+    点の間は線形補間（右端から左端へも回り込んでつなぐ）。
+    """
+    pts = sorted((int(x) % WIDTH, int(y)) for x, y in points)
+    if np is not None:
+        xs = np.array([p[0] for p in pts], dtype=np.float64)
+        ys = np.array([p[1] for p in pts], dtype=np.float64)
+        return [int(round(v)) for v in np.interp(np.arange(WIDTH), xs, ys, period=WIDTH)]
+    cols = []
+    ext = [(pts[-1][0] - WIDTH, pts[-1][1])] + pts + [(pts[0][0] + WIDTH, pts[0][1])]
+    j = 0
+    for x in range(WIDTH):
+        while ext[j + 1][0] < x:
+            j += 1
+        (x0, y0), (x1, y1) = ext[j], ext[j + 1]
+        cols.append(int(round(y0 + (y1 - y0) * (x - x0) / (x1 - x0))) if x1 != x0 else y0)
+    return cols
+
+def cached_ground_heights(bg_file: str, bg_scaled: pg.Surface) -> list[int]:
+    """
+    detect_ground_heights の結果をディスクにキャッシュして返す（cached_ground_y と同じファイル・同じ鍵の引き方）。
+    """
+    try:
+        key = _ground_cache_key(bg_file, bg_scaled.get_size())
+    except OSError:
+        key = None
+    if key is None:
+        return detect_ground_heights(bg_scaled)
+    key += ":cols"
+
+    cache = _load_json_cache(GROUND_CACHE_FILE)
+    if isinstance(cache.get(key), list):
+        return cache[key]
+
+    cols = detect_ground_heights(bg_scaled)
+    cache[key] = cols
+    _save_json_cache(GROUND_CACHE_FILE, cache)
+    return cols
+
 # =========================
 # クラス
 # =========================
@@ -315,12 +852,10 @@ def detect_ground_y(bg_scaled: pg.Surface) -> int:
 # 中ボス関連クラス(担当：稲葉)
 # =========================
 
-class Beam_tbos(pg.sprite.Sprite):
+class Beam_tbos(PooledSprite):
     """中ボスが放つビーム"""
-    def __init__(self, pos: tuple[int, int]):
-        super().__init__()
-        raw_image = load_image("Beam_tbos.png")
-        self.image = pg.transform.smoothscale(raw_image, (200, 80))
+    def reset(self, pos: tuple[int, int]):
+        self.image = load_scaled("Beam_tbos.png", (200, 80))
         self.rect = self.image.get_rect(center=pos)
         self._speed = 15
 
@@ -329,13 +864,11 @@ class Beam_tbos(pg.sprite.Sprite):
         if self.rect.right < 0:
             self.kill()
 
-class Meteor(pg.sprite.Sprite):
+class Meteor(PooledSprite):
     """中ボスが降らせる隕石"""
-    def __init__(self, target_x: int):
-        super().__init__()
-        size = random.randint(50, 150)
-        raw_image = load_image("Meteor.png")
-        self.image = pg.transform.smoothscale(raw_image, (size, size))
+    def reset(self, target_x: int):
+        size = quantize_size(random.randint(50, 150))
+        self.image = load_scaled("Meteor.png", (size, size))
         self.rect = self.image.get_rect(center=(target_x, -50))
         self._speed_y = 6
 
@@ -350,16 +883,18 @@ class MidBoss(pg.sprite.Sprite):
     """
     def __init__(self):
         super().__init__()
-        raw_image = load_image("Ramieru.png")
-        self.image = pg.transform.smoothscale(raw_image, (300, 300))
+        self.image = load_scaled("Ramieru.png", (300, 300))
         self.rect = self.image.get_rect()
         self.rect.center = (WIDTH - 150, get_ground_y() - 200)
         
         self._timer = 0
         self.hp = 1500
+        self._attacks = Timeline(boss_pattern("midboss"))  # ビーム・隕石・弾幕の予定
 
-    def update(self, bird_rect: pg.Rect, beams_tbos: pg.sprite.Group, meteors: pg.sprite.Group):
+    def update(self, bird_rect: pg.Rect, beams_tbos: pg.sprite.Group, meteors: pg.sprite.Group,
+               barrage: "ProjectileField | None" = None, meteor_cap: int = 0):
         self._timer += 1
+        self._meteor_cap = meteor_cap
 
         # 【上下移動の計算】
         # math.sin を使うことで滑らかな波のような動きにする
@@ -370,37 +905,145 @@ class MidBoss(pg.sprite.Sprite):
         self._base_y = get_ground_y() - 250
         self.rect.centery = self._base_y + move_y
 
-        # ビーム発射（1.5秒に1回）
-        if self._timer % 90 == 0:
-            beams_tbos.add(Beam_tbos(self.rect.center))
+        self._attacks.run(self._timer, lambda ev, now: self._fire(ev, now, bird_rect, beams_tbos, meteors, barrage))
 
-        # 隕石落下（2秒に1回、こうかとんの頭上に降らす）
-        if self._timer % 120 == 0:
-            meteors.add(Meteor(bird_rect.centerx))
+    def _fire(self, ev: dict, now: int, bird_rect: pg.Rect, beams_tbos: pg.sprite.Group,
+              meteors: pg.sprite.Group, barrage: "ProjectileField | None") -> None:
+        kind = ev["event"]
+        if kind == "beam_tbos":    # ビーム発射
+            beams_tbos.add(Beam_tbos.acquire(self.rect.center))
+        elif kind == "meteor":     # 隕石落下（こうかとんの頭上に降らす）
+            if not self._meteor_cap or len(meteors) < self._meteor_cap:
+                meteors.add(Meteor.acquire(bird_rect.centerx))
+        elif kind == "barrage_ring":
+            emit_barrage_ring(barrage, self.rect.center, ev, now)
 
     def get_hp(self) -> int:
         return self.hp
 
+def emit_barrage_ring(barrage: "ProjectileField | None", center: tuple[int, int], ev: dict, now: int) -> None:
+    """
+    ボスの攻撃パターンの "barrage_ring"：回転するリング（count 発・speed・1フレームあたり spin 度回る）。
+    """
+    if barrage is not None:
+        barrage.emit_ring(center, ev["count"], ev["speed"], now * ev["spin"], size_idx=ev.get("size", 0))
+
 # =========================
 # ここまで
 # =========================
 
+_RENDER_SIZE: tuple[int, int] | None = None  # ゲーム画面を描く内部解像度（等倍なら None）
+
+def set_render_size(size: tuple[int, int] | None) -> None:
+    """
+    内部解像度を設定する。以後に作る Background はその大きさの帯も先に作っておく。
+    """
+    global _RENDER_SIZE
+    _RENDER_SIZE = tuple(size) if size is not None and tuple(size) != (WIDTH, HEIGHT) else None
+
 class Background:
-    def __init__(self, bg_file: str, speed: int):
-        raw = load_image(bg_file)
-        self._img = pg.transform.smoothscale(raw, (WIDTH, HEIGHT))
+    """
+    横スクロールする背景。
+
+    縮小済みの背景を横に2枚並べた幅 2*WIDTH の帯（不透明・画面と同じピクセル形式）を
+    最初に1回だけ作り、毎フレームはその帯から画面幅ぶんを切り出して1回で blit する。
+
+    地面の高さは列ごとのハイトマップで持ち、スクロールに合わせて get_ground_y(x) の引く位置をずらす。
+    ground はステージファイルの "ground"：
+    - "flat"（省略時）: 背景から1本の地面ラインを推定した平らな地面
+    - "detect": 列ごとに地面ラインを推定する（段差・坂のある背景向け）
+    - [[x, y], ...]: 背景1枚ぶんの地面の形を点で指定する
+    """
+    def __init__(self, bg_file: str, speed: int, ground: str | list = "flat"):
+        self._setup(bg_file, speed, ground)
+        if _RENDER_SIZE is not None:
+            self.prepare_size(_RENDER_SIZE)
+        self.activate()
+
+    @classmethod
+    def prepare(cls, bg_file: str, speed: int, ground: str | list = "flat", scaled=None) -> "Background":
+        """
+        地面の高さ（グローバル）を変えずに作る。使い始めるときに activate() を呼ぶこと。
+
+        scaled(size) は背景を size に縮めた画像を返す関数（省略時は load_scaled）。
+        load_scaled は画像キャッシュに書くのでメインスレッド専用。ワーカースレッドで作るときは
+        キャッシュに触らない scaled を渡すこと（_prepare_stage を参照）。
+        """
+        bg = cls.__new__(cls)
+        bg._setup(bg_file, speed, ground, scaled)
+        return bg
+
+    def _setup(self, bg_file: str, speed: int, ground: str | list, scaled=None) -> None:
+        self._scaled = scaled if scaled is not None else (lambda size: load_scaled(bg_file, size))
+        img = self._scaled((WIDTH, HEIGHT))
+        self._bg_file = bg_file
+        self._strip = self._build_strip(img)
+        self._small_strips: dict[tuple[int, int], pg.Surface] = {}  # 内部解像度で描くとき用
         self._speed = speed
-        self._x1 = 0
-        self._x2 = WIDTH
-        set_ground_y(detect_ground_y(self._img))
-
-    def update(self, screen):
-        self._x1 -= self._speed
-        self._x2 -= self._speed
-        if self._x1 <= -WIDTH: self._x1 = self._x2 + WIDTH
-        if self._x2 <= -WIDTH: self._x2 = self._x1 + WIDTH
-        screen.blit(self._img, (self._x1, 0))
-        screen.blit(self._img, (self._x2, 0))
+        self._offset = 0  # 帯の切り出し開始位置（0 <= _offset < WIDTH）
+        if ground == "flat":
+            self._ground_y = cached_ground_y(bg_file, img)
+            self._ground_cols = None
+        else:
+            if ground == "detect":
+                cols = cached_ground_heights(bg_file, img)
+            else:
+                cols = ground_from_points(ground)
+            self._ground_cols = cols
+            self._ground_y = sorted(cols)[len(cols) // 2]  # 代表の高さは中央値
+
+    def prepare_size(self, size: tuple[int, int]) -> None:
+        """
+        内部解像度 size で描くための帯を作っておく（最初の draw で作ると引っかかるので）。
+        """
+        size = tuple(size)
+        if size not in self._small_strips:
+            self._small_strips[size] = self._build_strip(self._scaled(size))
+
+    def activate(self) -> None:
+        """
+        この背景の地面の高さ（ハイトマップとスクロール位置）を get_ground_y() に反映する。
+        以後の（メインスレッドでの）帯の作り直しは load_scaled を使う。
+        """
+        self._scaled = lambda size: load_scaled(self._bg_file, size)
+        set_ground_y(self._ground_y, self._ground_cols)
+        set_ground_scroll(self._offset)
+
+    @staticmethod
+    def _build_strip(img: pg.Surface) -> pg.Surface:
+        w, h = img.get_size()
+        display = pg.display.get_surface() if pg.display.get_init() else None
+        if display is not None:
+            strip = pg.Surface((w * 2, h), 0, display)  # 画面と同じピクセル形式
+        else:
+            strip = pg.Surface((w * 2, h))
+        strip.blit(img, (0, 0))
+        strip.blit(img, (w, 0))
+        return strip
+
+    def update(self):
+        """
+        スクロール位置だけ進める（描画は draw）。
+        """
+        self._offset = (self._offset + self._speed) % WIDTH
+        set_ground_scroll(self._offset)
+
+    def draw(self, screen, alpha: float = 1.0):
+        """
+        alpha < 1 なら前のステップとの間のスクロール位置で描く（固定ステップの補間）。
+        screen が WIDTH x HEIGHT より小さい（内部解像度で描く）ときは、その大きさの帯から切り出す。
+        """
+        offset = self._offset
+        if alpha < 1.0:
+            offset = (offset - self._speed * (1.0 - alpha)) % WIDTH
+        size = screen.get_size()
+        if size == (WIDTH, HEIGHT):
+            screen.blit(self._strip, (0, 0), (round(offset) % WIDTH, 0, WIDTH, HEIGHT))
+            return
+        self.prepare_size(size)
+        strip = self._small_strips[size]
+        w, h = size
+        screen.blit(strip, (0, 0), (round(offset * w / WIDTH) % w, 0, w, h))
 
     def get_speed(self) -> int:
         return self._speed
@@ -412,7 +1055,7 @@ class Bird(pg.sprite.Sprite):
     """
     def __init__(self, num: int, xy: tuple[int, int]):
         super().__init__()
-        img0 = pg.transform.rotozoom(load_image(f"{num}.png"), 0, 0.9)
+        img0 = load_rotozoom(f"{num}.png", 0, 0.9)
         img = pg.transform.flip(img0, True, False)
         self._imgs = {+1: img, -1: img0}
         self._dir = +1
@@ -430,13 +1073,14 @@ class Bird(pg.sprite.Sprite):
         self._max_jump = 2
 
         self.rect.center = xy
-        self.rect.bottom = get_ground_y() + FOOT_OFFSET_BIRD
+        self.rect.bottom = get_ground_y(self.rect.centerx) + FOOT_OFFSET_BIRD
 
         # --- HP/無敵時間（追加） ---高柳
         self.hp = 100
         self._inv = 0   # 無敵フレーム（連続ダメ防止）
 
         self._damage_tmr = 0  # 追加：ダメージ点滅用タイマー
+        self._visible = True  # 点滅で「消える」フレームは False
 
     def set_damage(self):
             #"""追加：ダメージを受けたときにタイマーをセットする"""
@@ -447,7 +1091,11 @@ class Bird(pg.sprite.Sprite):
             self._vy = self._jump_v0
             self._jump_count += 1
 
-    def update(self, key_lst: list[bool], screen: pg.Surface) -> None:
+    def update(self, key_lst) -> None:
+        """
+        移動・ジャンプ・点滅タイマーを1フレーム進める（描画は draw）。
+        key_lst は pg.K_LEFT / pg.K_RIGHT で引ける押下状態。
+        """
         self._vx = 0
         if key_lst[pg.K_LEFT]:
             self._vx = -self._speed
@@ -465,21 +1113,29 @@ class Bird(pg.sprite.Sprite):
         self._vy += self._gravity
         self.rect.y += int(self._vy)
 
-        gy = get_ground_y()
+        gy = get_ground_y(self.rect.centerx)
         if self.rect.bottom >= gy:
             self.rect.bottom = gy
             self._vy = 0.0
             self._jump_count = 0
 
         # 追加：ダメージ点滅ロジック
+        self._visible = True
         if self._damage_tmr > 0:
             self._damage_tmr -= 1
             # 2フレームに1回描画しない時間を作ることで点滅させる
             if self._damage_tmr % 4 < 2:
-                return # 描画せずに終了（点滅の「消える」瞬間）
+                self._visible = False # 点滅の「消える」瞬間
 
         self.image = self._imgs[self._dir]
-        screen.blit(self.image, self.rect)
+
+    def draw(self, screen: pg.Surface) -> None:
+        if self._visible:
+            screen.blit(self.image, self.rect)
+
+    def is_visible(self) -> bool:
+        """点滅中に消えているフレームなら False"""
+        return self._visible
 
     def get_rect(self) -> pg.Rect:
         return self.rect
@@ -514,7 +1170,17 @@ class Bird(pg.sprite.Sprite):
 # 敵スポーン関連関数(担当：高柳)
 # ========================
 
-class Enemy(pg.sprite.Sprite):
+ENEMY_SCALE = 0.05  # サイズ調整（必要なら数字だけ変えてOK）
+
+def enemy_image_file(stage: int, kind: str) -> str:
+    """
+    ステージごとの敵画像を選ぶ（UFO/alienは使わない）。
+    """
+    if stage == 1:
+        return "enemy3.png" if kind == "ground" else "dagon.png"
+    return "enemy4.png" if kind == "ground" else "stennow.png"
+
+class Enemy(PooledSprite):
     """
     モブ敵（2パターン）
     - ground : 地面に沿って左へ流れる（ジャンプで踏める）
@@ -522,22 +1188,11 @@ class Enemy(pg.sprite.Sprite):
     ステージ1: doragon1.png / gimen1.png
     ステージ2: doragon2.png / gimen2.png
     """
-    def __init__(self, stage: int, kind: str = "ground", speed: int = 7):
-        super().__init__()
+    def reset(self, stage: int, kind: str = "ground", speed: int = 7):
         self.stage = stage
         self.kind = kind
 
-        # ステージごとの画像を選ぶ（UFO/alienは使わない）
-        if self.stage == 1:
-            img_file = "enemy3.png" if self.kind == "ground" else "dagon.png"
-        else:
-            img_file = "enemy4.png" if self.kind == "ground" else "stennow.png"
-
-        base = load_image(img_file)
-
-        # サイズ調整（必要なら数字だけ変えてOK）
-        scale = 0.05 if self.kind == "ground" else 0.05
-        self.image = pg.transform.rotozoom(base, 0, scale)
+        self.image = load_rotozoom(enemy_image_file(self.stage, self.kind), 0, ENEMY_SCALE)
         self.rect = self.image.get_rect()
 
         # 右端から左へ流れる（地面と平行）
@@ -545,7 +1200,7 @@ class Enemy(pg.sprite.Sprite):
         self.vy = 0
         self.rect.left = WIDTH + random.randint(0, 80)
 
-        gy = get_ground_y()
+        gy = get_ground_y(self.rect.centerx)
         if self.kind == "ground":
             self.rect.bottom = gy
         else:
@@ -554,6 +1209,8 @@ class Enemy(pg.sprite.Sprite):
 
     def update(self):
         self.rect.move_ip(self.vx, self.vy)
+        if self.kind == "ground":
+            self.rect.bottom = get_ground_y(self.rect.centerx)  # 段差・坂に沿って歩く
 
         if (
             self.rect.right < -50 or
@@ -571,16 +1228,14 @@ class Boss(pg.sprite.Sprite):
     def __init__(self):
         super().__init__()
 
-        self.base_image = pg.transform.smoothscale(
-            load_image("zerueru1.png"), (200, 200)
-        )
+        self.base_image = load_scaled("zerueru1.png", (200, 200))
         self.hit_image = self.base_image.copy()
         self.hit_image.fill((255, 80, 80), special_flags=pg.BLEND_RGBA_MULT)
 
         self.image = self.base_image
         self.rect = self.image.get_rect()
         self.rect.centerx = WIDTH // 2
-        self.rect.bottom = get_ground_y() + FOOT_OFFSET_BOSS
+        self.rect.bottom = get_ground_y(self.rect.centerx) + FOOT_OFFSET_BOSS
 
         self._vx = random.choice([-4, 4])
         self._vy = 0
@@ -595,15 +1250,17 @@ class Boss(pg.sprite.Sprite):
         self.hp = FINAL_BOSS_HP
 
         self._shot_tmr = 0
-        self._shot_interval = 90  # 1.5秒ごと
+        self._attacks = Timeline(boss_pattern("boss"))  # 横隕石・弾幕の予定
 
-    def update(self, bird_rect: pg.Rect, boss_meteors: pg.sprite.Group):
+    def update(self, bird_rect: pg.Rect, boss_meteors: pg.sprite.Group,
+               barrage: "ProjectileField | None" = None, meteor_cap: int = 0):
+        self._meteor_cap = meteor_cap
         self._action_tmr += 1
         if self._action_tmr >= self._next_action:
             self._action_tmr = 0
             self._next_action = random.randint(60, 120)
             self._vx = random.choice([-4, 4])
-            if random.random() < 0.4 and self.rect.bottom >= get_ground_y() + FOOT_OFFSET_BOSS:
+            if random.random() < 0.4 and self.rect.bottom >= get_ground_y(self.rect.centerx) + FOOT_OFFSET_BOSS:
                 self._vy = self._jump_v0
 
         self.rect.x += self._vx
@@ -613,8 +1270,9 @@ class Boss(pg.sprite.Sprite):
         self._vy += self._gravity
         self.rect.y += int(self._vy)
 
-        if self.rect.bottom >= get_ground_y() + FOOT_OFFSET_BOSS:
-            self.rect.bottom = get_ground_y() + FOOT_OFFSET_BOSS
+        floor = get_ground_y(self.rect.centerx) + FOOT_OFFSET_BOSS
+        if self.rect.bottom >= floor:
+            self.rect.bottom = floor
             self._vy = 0
 
         if self.hit_timer > 0:
@@ -623,7 +1281,14 @@ class Boss(pg.sprite.Sprite):
         self.image = self.hit_image if self.hit_timer > 0 else self.base_image
 
         self._shot_tmr += 1
-        if self._shot_tmr % self._shot_interval == 0:
+        self._attacks.run(self._shot_tmr, lambda ev, now: self._fire(ev, now, bird_rect, boss_meteors, barrage))
+
+    def _fire(self, ev: dict, now: int, bird_rect: pg.Rect, boss_meteors: pg.sprite.Group,
+              barrage: "ProjectileField | None") -> None:
+        kind = ev["event"]
+        if kind == "side_meteor":
+            if self._meteor_cap and len(boss_meteors) >= self._meteor_cap:
+                return  # 画質を下げている間は同時に出す数を抑える
             # こうかとんがボスの左にいるなら左へ、右なら右へ
             d = -1 if bird_rect.centerx < self.rect.centerx else +1
 
@@ -633,7 +1298,9 @@ class Boss(pg.sprite.Sprite):
             else:
                 start = (self.rect.right + 20, self.rect.centery)
 
-            boss_meteors.add(SideMeteor(start, d))
+            boss_meteors.add(SideMeteor.acquire(start, d))
+        elif kind == "barrage_ring":
+            emit_barrage_ring(barrage, self.rect.center, ev, now)
 
     def on_hit(self):
         self.hit_timer = 10
@@ -641,13 +1308,11 @@ class Boss(pg.sprite.Sprite):
     def draw(self, screen):
         screen.blit(self.image, self.rect)
 
-class SideMeteor(pg.sprite.Sprite):
+class SideMeteor(PooledSprite):
     """最終ボスが横向きに放つ隕石（Meteor.png流用）"""
-    def __init__(self, start_xy: tuple[int, int], direction: int):
-        super().__init__()
-        size = random.randint(50, 150)
-        raw_image = load_image("Meteor.png")
-        self.image = pg.transform.smoothscale(raw_image, (size, size))
+    def reset(self, start_xy: tuple[int, int], direction: int):
+        size = quantize_size(random.randint(50, 150))
+        self.image = load_scaled("Meteor.png", (size, size))
         self.rect = self.image.get_rect(center=start_xy)
 
         self._dir = +1 if direction >= 0 else -1
@@ -663,25 +1328,57 @@ class SideMeteor(pg.sprite.Sprite):
 # ここまで
 # =========================
 
-class Explosion(pg.sprite.Sprite):
+EXPLOSION_FRAMES = 12  # 爆発アニメの枚数（寿命をこの枚数に等分して順に出す）
+
+def _explosion_frame(src: pg.Surface, i: int, n: int) -> pg.Surface:
     """
-    爆発エフェクト：中心で拡大縮小を繰り返しながら消滅
+    爆発アニメの i 枚目（全 n 枚）。2枚ごとに元画像と上下左右反転を入れ替え、
+    進むにつれて縮みながら薄くなる。大きさは元画像のまま（中央に置く）なので rect は変わらない。
     """
-    def __init__(self, center_xy: tuple[int, int], life: int = 30):
-        super().__init__()
-        img = load_image("explosion.gif")
-        self._imgs = [img, pg.transform.flip(img, True, True)] # 拡大縮小用に2枚用意
-        self.image = self._imgs[0]
+    t = i / max(1, n - 1)
+    img = pg.transform.flip(src, True, True) if (i // 2) % 2 else src
+    w, h = src.get_size()
+    scale = 1.0 - 0.45 * t
+    small = pg.transform.rotozoom(img, 0, scale)  # 32bit（透明度つき）になる
+    small.fill((255, 255, 255, round(255 * (1.0 - 0.7 * t))), special_flags=pg.BLEND_RGBA_MULT)
+    frame = pg.Surface((w, h), pg.SRCALPHA, small)
+    frame.blit(small, small.get_rect(center=(w // 2, h // 2)))
+    return frame
+
+_EXPLOSION_SEQS: dict[int, list[pg.Surface]] = {}
+
+def explosion_frames(n: int = EXPLOSION_FRAMES) -> list[pg.Surface]:
+    """
+    爆発アニメの連番画像（n 枚）。全 Explosion で共有し、枚数ごとに1回だけ作る。
+    """
+    seq = _EXPLOSION_SEQS.get(n)
+    if seq is None:
+        seq = _EXPLOSION_SEQS[n] = [
+            _get_derived(("explosion.gif", "explosion", i, n),
+                         lambda i=i: _explosion_frame(load_image("explosion.gif"), i, n))
+            for i in range(n)
+        ]
+    return seq
+
+class Explosion(PooledSprite):
+    """
+    爆発エフェクト：中心で拡大縮小を繰り返しながら縮んで薄くなり、消滅
+    画像は explosion_frames() の共有の連番（作り直さない）で、寿命の進み具合に合わせて選ぶ。
+    """
+    def reset(self, center_xy: tuple[int, int], life: int = 30):
+        self._frames = explosion_frames(quality("explosion_frames"))
+        self.image = self._frames[0]
         self.rect = self.image.get_rect(center=center_xy)
-        self._life = life
+        self._life = self._life0 = life
 
     def update(self) -> None:
         self._life -= 1
-        self.image = self._imgs[(self._life // 5) % 2] # 5フレームごとに切替
+        n = len(self._frames)
+        self.image = self._frames[min(n - 1, (self._life0 - self._life) * n // self._life0)]
         if self._life <= 0:
             self.kill()
 
-class Beam(pg.sprite.Sprite):
+class Beam(PooledSprite):
     """
     攻撃弾（ビーム）。
 
@@ -691,15 +1388,12 @@ class Beam(pg.sprite.Sprite):
     """
     RANGE_PX = 200
 
-    def __init__(self, start_xy: tuple[int, int], direction: int = +1):
-        super().__init__()
-        base = load_image("beam_k.png")
-
+    def reset(self, start_xy: tuple[int, int], direction: int = +1):
         self._dir = +1 if direction >= 0 else -1
         angle = (0 if self._dir == +1 else 180) + BEAM_IMG_OFFSET_DEG
 
         # 画像も向きに合わせる（回転の仕様：反時計回り、負で時計回り）:contentReference[oaicite:3]{index=3}
-        self.image = pg.transform.rotozoom(base, angle, 1.0)
+        self.image = load_rotozoom("beam_k.png", angle, 1.0)
         self.rect = self.image.get_rect(center=start_xy)
 
         self._vx = 16 * self._dir
@@ -720,46 +1414,106 @@ class Beam(pg.sprite.Sprite):
         if self.rect.right < 0 or self.rect.left > WIDTH:
             self.kill()
 
-class Arrow(pg.sprite.Sprite):
+# ----- 矢の軌道テーブル＆回転画像アトラス -----
+# 矢はどれも同じ初速・重力で飛ぶので、軌道と向きは1回だけ計算して共有する
+ARROW_SPEED_X = 16
+ARROW_VY0 = -10.5
+ARROW_GRAVITY = 0.6
+ARROW_SCALE = 0.2
+ARROW_ANGLE_STEP_DEG = 1
+ARROW_GROUND_HIT_MARGIN = 12  # 8〜20くらいで調整
+
+_ARROW_PATHS: dict[int, list[tuple[int, int, float, int]]] = {}
+
+def _arrow_angle_index(angle: float) -> int:
+    """
+    角度(度)をアトラスの添字（ARROW_ANGLE_STEP_DEG 刻み）に丸める。
+    """
+    n = 360 // ARROW_ANGLE_STEP_DEG
+    return int(round(angle / ARROW_ANGLE_STEP_DEG)) % n
+
+def arrow_image(angle_index: int) -> pg.Surface:
+    """
+    アトラスから angle_index 番目の矢画像を返す（実体は変換済みSurfaceキャッシュ）。
+    """
+    return load_rotozoom("arrow.png", angle_index * ARROW_ANGLE_STEP_DEG, ARROW_SCALE)
+
+def get_arrow_path(direction: int) -> list[tuple[int, int, float, int]]:
+    """
+    発射後 k フレーム目の (累積dx, 累積dy, vy, 角度添字) を並べた軌道テーブルを返す。
+
+    - 更新順は元の Arrow.update と同じ（x移動 → vy加速 → y移動 → 向き計算）
+    - 地面より確実に下（画面高さの2倍）まで落ちたところで打ち切る
+    - 角度ごとの画像はここでは作らない（asset_manifest に載せて先読みする）
+    """
+    d = +1 if direction >= 0 else -1
+    path = _ARROW_PATHS.get(d)
+    if path is not None:
+        return path
+
+    vx = ARROW_SPEED_X * d
+    vy = ARROW_VY0
+    dx = dy = 0
+    path = []
+    while dy <= HEIGHT * 2:
+        dx += vx
+        vy += ARROW_GRAVITY
+        dy += int(vy)
+        # yは下に増えるので -atan2(vy, vx)（反時計回りが正）
+        angle = -math.degrees(math.atan2(vy, vx)) + ARROW_IMG_OFFSET_DEG
+        path.append((dx, dy, vy, _arrow_angle_index(angle)))
+
+    _ARROW_PATHS[d] = path
+    return path
+
+def arrow_angle_indices() -> set[int]:
+    """
+    左右どちらの軌道でも使う角度添字の集合（発射直後の向きを含む）。
+    """
+    used = {_arrow_angle_index(ARROW_IMG_OFFSET_DEG)}
+    for d in (+1, -1):
+        used |= {p[3] for p in get_arrow_path(d)}
+    return used
+
+class Arrow(PooledSprite):
     """
     矢：放物線を描きつつ右へ進む
+
+    位置と向きは get_arrow_path() のテーブルを引くだけで、毎フレームの三角関数や回転はしない。
     """
-    def __init__(self, start_xy: tuple[int, int], direction: int = +1):
-        super().__init__()
-        self._base_image = load_image("arrow.png")
+    def reset(self, start_xy: tuple[int, int], direction: int = +1):
         self._dir = +1 if direction >= 0 else -1
+        self._path = get_arrow_path(self._dir)
+        self._frame = 0
 
-        self._scale = 0.2
-        self.image = pg.transform.rotozoom(self._base_image, ARROW_IMG_OFFSET_DEG, self._scale)
+        self.image = arrow_image(_arrow_angle_index(ARROW_IMG_OFFSET_DEG))
         self.rect = self.image.get_rect(center=start_xy)
+        self._origin = self.rect.center
+        self._angle_index = None
 
-        self._vx = 16 * self._dir
-        self._vy = -10.5
-        self._g = 0.6
-        self._angle = None
-        
     def update(self) -> None:
-        self.rect.x += self._vx
-        self._vy += self._g
-        self.rect.y += int(self._vy)
-
-        # 速度ベクトル(vx, vy)の向きに合わせる
-        # angleは「反時計回りの度数」（負で時計回り） :contentReference[oaicite:2]{index=2}
-        # yは下に増えるので -atan2(vy, vx) が自然 :contentReference[oaicite:3]{index=3}
-        new_angle = -math.degrees(math.atan2(self._vy, self._vx)) + ARROW_IMG_OFFSET_DEG
+        if self._frame >= len(self._path):
+            self.kill()
+            return
+        dx, dy, vy, angle_index = self._path[self._frame]
+        self._frame += 1
 
-        if self._angle is None or abs(new_angle - self._angle) > 1.0:
-            self._angle = new_angle
-            center = self.rect.center
-            self.image = pg.transform.rotozoom(self._base_image, self._angle, self._scale)
+        center = (self._origin[0] + dx, self._origin[1] + dy)
+        if angle_index != self._angle_index:
+            self._angle_index = angle_index
+            self.image = arrow_image(angle_index)
             self.rect = self.image.get_rect(center=center)
-
-        ground = get_ground_y()
-        GROUND_HIT_MARGIN = 12  # 8〜20くらいで調整
+        else:
+            self.rect.center = center
 
         # ★上昇中は地面判定しない（地面に立って撃った瞬間の即死を防ぐ）
-        if self._vy >= 0 and self.rect.bottom >= ground - GROUND_HIT_MARGIN:
-            self.kill()
+        # 地面は真下と進む先（矢じり側の端）の高い方で見る（上り坂・段差に先に刺さる）
+        if vy >= 0:
+            rect = self.rect
+            lead_x = rect.right if self._dir > 0 else rect.left
+            gy = min(get_ground_y(rect.centerx), get_ground_y(lead_x))
+            if rect.bottom >= gy - ARROW_GROUND_HIT_MARGIN:
+                self.kill()
 
 # =========================
 # アイテム関連関数(担当：岩間)
@@ -843,16 +1597,16 @@ class Item(pg.sprite.Sprite):
         self._category = idef.get_category()
         self._speed = stage_params(stage)["item_speed"]
 
-        img = load_image(idef.get_img_file())
         if idef.get_scale() != 1.0:
-            img = pg.transform.rotozoom(img, 0, idef.get_scale())
-        self.image = img
+            self.image = load_rotozoom(idef.get_img_file(), 0, idef.get_scale())
+        else:
+            self.image = load_image(idef.get_img_file())
         self.rect = self.image.get_rect()
 
         self.rect.left = WIDTH + random.randint(0, 200)
 
         # 地面より上のどこかに出す
-        gy = get_ground_y()
+        gy = get_ground_y(self.rect.centerx)
         margin = 10
         lowest = gy - (self.rect.height // 2) - margin   # これより下に出さない
         highest = max(60,self.rect.height // 2 + margin)                                     # これより上に出さない（画面上部）
@@ -874,6 +1628,17 @@ class Item(pg.sprite.Sprite):
     def get_category(self) -> str:
         return self._category
 
+def default_item_defs() -> dict[str, ItemDef]:
+    """
+    ゲームで使うアイテム定義（ファイル名は要調整）。
+    """
+    return {
+        "Beam": ItemDef("Beam", "attack", "beam_k.png", 6, scale=0.7),
+        "arrow": ItemDef("arrow", "attack", "arrow.png", 6, scale=0.2),
+        "kinoko": ItemDef("kinoko", "status", "kinoko.png", 3, scale=0.1),
+        "tabaco": ItemDef("tabaco", "status", "tabaco.png", 3, scale=0.025),
+    }
+
 def pick_weighted_item_id(item_defs: dict[str, ItemDef], stage: int) -> str:
     """
     item_defs の weight に基づいて item_id を1つ返す（重み付き抽選）。
@@ -900,27 +1665,11 @@ def pick_weighted_item_id(item_defs: dict[str, ItemDef], stage: int) -> str:
             return i
     return ids[-1]
 
-def maybe_spawn_item(tmr: int, stage: int, item_defs: dict[str, ItemDef], items: pg.sprite.Group) -> None:
+def spawn_item(stage: int, item_defs: dict[str, ItemDef], items: pg.sprite.Group) -> None:
     """
-    アイテムをスポーンするかを判定し、スポーンする場合は items に追加する。
-
-    - stage に応じてスポーン間隔(interval)と確率(prob)を切り替える
-    - tmr が interval の倍数のタイミングのみ抽選する
-    - 当選したら重み付き抽選で item_id を選ぶ
+    重み付き抽選で選んだアイテムを1つ items に追加する。
+    （間隔と確率はステージファイルの "item" イベントで決まる）
     """
-    if stage == 1:
-        interval = ITEM_SPAWN_INTERVAL_STAGE1
-        prob = ITEM_SPAWN_PROB_STAGE1
-    else:
-        interval = ITEM_SPAWN_INTERVAL_STAGE2
-        prob = ITEM_SPAWN_PROB_STAGE2
-
-    if tmr % interval != 0:
-        return
-
-    if random.random() > prob:
-        return
-
     item_id = pick_weighted_item_id(item_defs, stage)
     items.add(Item(item_defs[item_id], stage))
     
@@ -980,469 +1729,2287 @@ def apply_status_from_current(inv: Inventory, bird: Bird) -> None:
         bird.set_max_jump(2)
 
 # =========================
-# メイン
+# UI(担当：佐藤)
 # =========================
-def main():
-    pg.display.set_caption("こうかとんダンジョン")
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    clock = pg.time.Clock()
+def make_outlined_text(size, text, text_color, outline_color, outline_px=2):
+    """
+    縁取り付きの文字列 Surface を作る（周囲 outline_px の範囲に縁色をずらして重ねる）。
+    画質を下げている間は縁取りなし（本体だけ）。
+    """
+    base = render_text(size, text, text_color)
+    if not quality("outline"):
+        return base
+    w, h = base.get_width() + outline_px*2, base.get_height() + outline_px*2
+    surf = pg.Surface((w, h), pg.SRCALPHA)
+    for dx in range(-outline_px, outline_px + 1):
+        for dy in range(-outline_px, outline_px + 1):
+            if dx == 0 and dy == 0:
+                continue
+            surf.blit(render_text(size, text, outline_color), (dx + outline_px, dy + outline_px))
+    surf.blit(base, (outline_px, outline_px))
+    return surf
+
+class OutlinedGlyphAtlas:
+    """
+    縁取り文字の部品（"Score:" と数字0〜9）を最初に1回だけ作っておき、
+    文字列はその部品を並べて blit するだけで組み立てる（プレイ中はフォント描画しない）。
 
-    # ---- フォント ----
-    font = load_font(32)
-    font_ui = load_font(22)
-    font_item = load_font(22)
+    縁が隣の文字の本体に重ならないよう、全部品の縁 → 全部品の本体の順に重ねる。
+    """
+    def __init__(self, size: int, text_color, outline_color, outline_px: int = 2,
+                 pieces: tuple[str, ...] = ("Score:",) + tuple("0123456789")):
+        self._outline_px = outline_px
+        self._glyphs: dict[str, tuple[pg.Surface, pg.Surface]] = {}
+        for piece in pieces:
+            base = render_text(size, piece, text_color)
+            outline = pg.Surface(
+                (base.get_width() + outline_px * 2, base.get_height() + outline_px * 2), pg.SRCALPHA
+            )
+            edge = render_text(size, piece, outline_color)
+            for dx in range(-outline_px, outline_px + 1):
+                for dy in range(-outline_px, outline_px + 1):
+                    if dx == 0 and dy == 0:
+                        continue
+                    outline.blit(edge, (dx + outline_px, dy + outline_px))
+            self._glyphs[piece] = (outline, base)
+        # 長い部品から先に当てる（"Score:" を1文字ずつに分解しないため）
+        self._pieces = sorted(self._glyphs, key=len, reverse=True)
+
+    def split(self, text: str) -> list[str] | None:
+        """
+        text を部品の並びに分解する。部品に無い文字が含まれていれば None。
+        """
+        out = []
+        i = 0
+        while i < len(text):
+            for piece in self._pieces:
+                if text.startswith(piece, i):
+                    out.append(piece)
+                    i += len(piece)
+                    break
+            else:
+                return None
+        return out
+
+    def measure(self, pieces: list[str]) -> tuple[int, int]:
+        w = sum(self._glyphs[p][1].get_width() for p in pieces) + self._outline_px * 2
+        h = max(self._glyphs[p][1].get_height() for p in pieces) + self._outline_px * 2
+        return w, h
+
+    def blit(self, dest: pg.Surface, pieces: list[str], topleft: tuple[int, int]) -> None:
+        """
+        分解済みの部品を dest の topleft（縁込みの左上）から並べて描く。
+        """
+        x0, y0 = topleft
+        outlines = []
+        bases = []
+        x = x0
+        for p in pieces:
+            outline, base = self._glyphs[p]
+            outlines.append((outline, (x, y0)))
+            bases.append((base, (x + self._outline_px, y0 + self._outline_px)))
+            x += base.get_width()
+        if quality("outline"):
+            dest.blits(outlines, doreturn=False)
+        dest.blits(bases, doreturn=False)
+
+class Hud:
+    """
+    プレイ中のHUD（左下HP・右上Score・右下Attack/Status）を1枚の Surface にまとめて持つ。
 
-    # ---- 状態 ----
-    game_state = STATE_START
-    state_timer = 0
+    - update() で入力値（HP・スコア・所持アイテム）を受け取り、変わったウィジェットだけ描き直す
+    - draw() は各ウィジェットの範囲だけを1回の blits でまとめて画面に転送する
+    - ボスHPはボスに追従して動くので draw_boss_hp() で別に描く（文字はキャッシュ済み）
+    """
+    HP_BAR_POS = (20, HEIGHT - 25)
+    HP_BAR_SIZE = (200, 14)
+
+    def __init__(self, icons: dict[str, pg.Surface], font_size: int = 32, ui_size: int = 22, item_size: int = 22):
+        self._icons = icons
+        self._font_size = font_size
+        self._ui_size = ui_size
+        self._item_size = item_size
+
+        self._surf = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
+        self._score_atlas = OutlinedGlyphAtlas(font_size, (255, 255, 255), (0, 0, 0), outline_px=2)
+        self._rects: dict[str, pg.Rect] = {}   # ウィジェット名 -> HUD上の範囲
+        self._inputs: dict[str, object] = {}   # ウィジェット名 -> 最後に描いたときの入力値
+
+        self._attack_box = pg.Rect(
+            WIDTH - BOX_MARGIN - (BOX_W * 2 + BOX_GAP),  # 右端から「2箱+隙間」ぶん左へ
+            HEIGHT - BOX_MARGIN - BOX_H,                 # 下端から1箱ぶん上へ
+            BOX_W, BOX_H
+        )
+        self._status_box = pg.Rect(
+            WIDTH - BOX_MARGIN - BOX_W,                  # 右端に寄せる
+            HEIGHT - BOX_MARGIN - BOX_H,
+            BOX_W, BOX_H
+        )
 
-    # ---- ステージ ----
-    stage = 1
-    params = stage_params(stage)
-    bg = Background(params["bg_file"], params["bg_speed"])
-
-    # ---- プレイヤー ----
-    bird = Bird(3, (200, get_ground_y()))
-    bird.hp = HP_MAX  # HPをbird.hpに統一
-
-    # ---- スコア ----
-    score = 0
-
-    # ---- グループ ----
-    enemies = pg.sprite.Group()
-    items = pg.sprite.Group()
-    beams = pg.sprite.Group()
-    arrows = pg.sprite.Group()
-    exps = pg.sprite.Group()
-
-    midboss_group = pg.sprite.Group()
-    boss_meteors = pg.sprite.Group()
-    finalboss_group = pg.sprite.Group()
-    beams_tbos = pg.sprite.Group()
-    meteors = pg.sprite.Group()
-
-    # ---- アイテム定義（ファイル名は要調整）----
-    ITEM_DEFS = {
-        "Beam": ItemDef("Beam", "attack", "beam_k.png", 6, scale=0.7),
-        "arrow": ItemDef("arrow", "attack", "arrow.png", 6, scale=0.2),
-        "kinoko": ItemDef("kinoko", "status", "kinoko.png", 3, scale=0.1),
-        "tabaco": ItemDef("tabaco", "status", "tabaco.png", 3, scale=0.025),
-    }
-    inv = Inventory(ITEM_DEFS)
+    def update(self, hp: float, score: int, attack_id: str | None, status_id: str | None) -> None:
+        """
+        入力値が前回と違うウィジェットだけ作り直す。
+        """
+        self._refresh("hp", hp, self._build_hp)
+        # 縁取りは画質で変わるので、画質が切り替わったときも作り直す
+        self._refresh("score", (score, quality("outline")), lambda v: self._build_score(v[0]))
+        self._refresh("attack", attack_id, lambda v: self._build_box(self._attack_box, "Attack", v))
+        self._refresh("status", status_id, lambda v: self._build_box(self._status_box, "Status", v))
+
+    def invalidate(self) -> None:
+        """
+        次の update() で全ウィジェットを描き直させる。
+        """
+        self._inputs.clear()
+
+    def draw(self, screen: pg.Surface) -> None:
+        screen.blits([(self._surf, r, r) for r in self._rects.values()], doreturn=False)
+
+    def draw_boss_hp(self, screen: pg.Surface, boss: pg.sprite.Sprite) -> None:
+        hp_txt = render_text(self._font_size, f"HP:{boss.hp}", (255, 255, 255))
+        screen.blit(hp_txt, (boss.rect.centerx - hp_txt.get_width() // 2, boss.rect.top - 30))
+
+    def _refresh(self, name: str, value, build) -> None:
+        if name in self._inputs and self._inputs[name] == value:
+            return
+        self._inputs[name] = value
+        old = self._rects.get(name)
+        if old is not None:
+            self._surf.fill((0, 0, 0, 0), old)
+        self._rects[name] = build(value)
+
+    def _build_hp(self, hp: float) -> pg.Rect:
+        bar_x, bar_y = self.HP_BAR_POS
+        bar_w, bar_h = self.HP_BAR_SIZE
+
+        hp_surf = render_text(self._font_size, f"HP:{hp}", (255, 255, 255))
+        hp_pos = (bar_x, bar_y - hp_surf.get_height() - 6)  # ← ゲージの上に6px余白
+        self._surf.blit(hp_surf, hp_pos)
+
+        pg.draw.rect(self._surf, (255, 255, 255), (bar_x, bar_y, bar_w, bar_h))
+        ratio = max(0.0, min(1.0, hp / HP_MAX))
+        pg.draw.rect(self._surf, (0, 200, 0), (bar_x, bar_y, int(bar_w * ratio), bar_h))
+        return hp_surf.get_rect(topleft=hp_pos).union(pg.Rect(bar_x, bar_y, bar_w, bar_h))
+
+    def _build_score(self, score: int) -> pg.Rect:
+        score_str = f"Score:{score}"
+        pieces = self._score_atlas.split(score_str)
+        if pieces is not None:
+            w, h = self._score_atlas.measure(pieces)
+            score_pos = (WIDTH - w - 20, 20)
+            self._score_atlas.blit(self._surf, pieces, score_pos)
+            return pg.Rect(score_pos, (w, h))
+
+        # 部品に無い文字（負のスコアなど）は従来どおり丸ごと描く
+        score_surf = make_outlined_text(self._font_size, score_str, (255, 255, 255), (0, 0, 0), outline_px=2)
+        score_pos = (WIDTH - score_surf.get_width() - 20, 20)
+        self._surf.blit(score_surf, score_pos)
+        return score_surf.get_rect(topleft=score_pos)
+
+    def _build_box(self, box: pg.Rect, label: str, item_id: str | None) -> pg.Rect:
+        pg.draw.rect(self._surf, (0, 0, 0), box)
+        pg.draw.rect(self._surf, (255, 255, 255), box, 2)
+        self._surf.blit(render_text(self._ui_size, label, (255, 255, 255)), (box.x + 10, box.y + 8))
+
+        pad_x = 12
+        top_y = box.y + 34
+        area = pg.Rect(box.x + pad_x, top_y, box.w - pad_x * 2, box.h - (top_y - box.y) - 10)
+        if item_id is None:
+            self._surf.blit(render_text(self._item_size, "-", (255, 255, 255)), (area.x, area.y + 10))
+            return box.copy()
+        icon = self._icons.get(item_id)
+        icon_y = area.y + (area.h - icon.get_height()) // 2
+        self._surf.blit(icon, (area.x, icon_y))
+        name_x = area.x + icon.get_width() + 10
+        self._surf.blit(render_text(self._item_size, str(item_id), (255, 255, 255)), (name_x, area.y + 10))
+        return box.copy()
+
+# =========================
+# アセットの先読み
+# =========================
+ICON_SIZE = 40  # 右下UIのアイコン(px)
+
+def asset_manifest() -> list[tuple]:
+    """
+    ゲーム中に使う変換済み画像の一覧（変換済みSurfaceキャッシュのキーと同じ形）。
+
+    - (ファイル名, "scale", (w, h))
+    - (ファイル名, "rotozoom", 角度, 倍率)
+    - (ファイル名, "explosion", i, n)  … 爆発アニメの i 枚目（_explosion_frame）
+    - (ファイル名, "image")  … 変換せずに load_image のまま使う画像
+    読み込む元画像はこの一覧に出てくるファイル名から決まる。
+    画像を使うクラスを増やしたら、ここにも足すこと（足りない分はその場で読み込まれる）。
+    """
+    m: list[tuple] = []
+    for stage in (1, 2):
+        m.append((stage_params(stage)["bg_file"], "scale", (WIDTH, HEIGHT)))
+    m.append(("3.png", "rotozoom", 0.0, 0.9))                  # Bird
+    for stage in (1, 2):
+        for kind in ("ground", "air"):
+            m.append((enemy_image_file(stage, kind), "rotozoom", 0.0, ENEMY_SCALE))  # Enemy
+    m.append(("Ramieru.png", "scale", (300, 300)))             # MidBoss
+    m.append(("Beam_tbos.png", "scale", (200, 80)))            # Beam_tbos
+    for size in range(quantize_size(50), quantize_size(150) + 1, SIZE_BUCKET_PX):
+        m.append(("Meteor.png", "scale", (size, size)))        # Meteor / SideMeteor
+    m.append(("zerueru1.png", "scale", (200, 200)))            # Boss
+    for n in sorted({q["explosion_frames"] for q in QUALITY_LEVELS}):
+        for i in range(n):
+            m.append(("explosion.gif", "explosion", i, n))         # Explosion
+    for angle in (0, 180):
+        m.append(("beam_k.png", "rotozoom", float(angle + BEAM_IMG_OFFSET_DEG), 1.0))  # Beam
+    for idx in sorted(arrow_angle_indices()):
+        m.append(("arrow.png", "rotozoom", float(idx * ARROW_ANGLE_STEP_DEG), float(ARROW_SCALE)))
+    for idef in default_item_defs().values():
+        m.append((idef.get_img_file(), "scale", (ICON_SIZE, ICON_SIZE)))  # UIアイコン
+        if idef.get_scale() != 1.0:
+            m.append((idef.get_img_file(), "rotozoom", 0.0, float(idef.get_scale())))  # Item
+    return m
+
+def _decode_image(filename: str) -> pg.Surface:
+    path = find_asset_path(filename)
+    if path is None:
+        raise SystemExit(f"画像 {filename} の読み込みに失敗しました")
+    return pg.image.load(path)
+
+def _is_cached(key: tuple) -> bool:
+    if key[1] == "image":
+        return key[0] in _IMAGE_CACHE
+    return key in _DERIVED_CACHE
+
+def _build_derived(src: pg.Surface, keys: list[tuple]) -> list[tuple[tuple, pg.Surface]]:
+    out = []
+    for key in keys:
+        if key[1] == "scale":
+            out.append((key, pg.transform.smoothscale(src, key[2])))
+        elif key[1] == "explosion":
+            out.append((key, _explosion_frame(src, key[2], key[3])))
+        else:
+            out.append((key, pg.transform.rotozoom(src, key[2], key[3])))
+    return out
+
+class AssetPreloader:
+    """
+    asset_manifest() の画像をスレッドプールで読み込み・変換しておく。
+
+    1ファイルにつき「読み込み（ワーカー）→ 画面形式への変換（メイン）→ 拡大縮小・回転（ワーカー）」
+    の順に進める。同じ元画像を複数スレッドで同時に触らないよう、変換はファイル単位で1ジョブにまとめる。
+    キャッシュ（_IMAGE_CACHE / _DERIVED_CACHE）への書き込みは poll() を呼ぶメインスレッドだけが行う。
+    """
+    def __init__(self, manifest: list[tuple], workers: int | None = None):
+        self._by_file: dict[str, list[tuple]] = {}
+        for key in manifest:
+            self._by_file.setdefault(key[0], []).append(key)
+        self.total = len(self._by_file) + len(manifest)
+        self.loaded = 0
+        self._workers = workers or min(8, (os.cpu_count() or 1) + 1)
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: dict = {}
+
+    def start(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="preload")
+        for filename, keys in self._by_file.items():
+            if all(_is_cached(k) for k in keys):
+                # 変換後の画像が揃っていれば（アセットパックなど）元画像は読まない
+                self.loaded += 1 + len(keys)
+            elif filename in _IMAGE_CACHE:
+                self.loaded += 1
+                self._submit_derived(filename)
+            else:
+                self._pending[self._executor.submit(_decode_image, filename)] = ("decode", filename)
+
+    def _submit_derived(self, filename: str) -> None:
+        keys = [k for k in self._by_file[filename] if not _is_cached(k)]
+        self.loaded += len(self._by_file[filename]) - len(keys)
+        if keys:
+            job = self._executor.submit(_build_derived, _IMAGE_CACHE[filename], keys)
+            self._pending[job] = ("derive", filename)
+
+    def poll(self, timeout: float = 0.0) -> float:
+        """
+        終わったジョブの結果をキャッシュに入れ、進み具合（0.0〜1.0）を返す。
+        timeout 秒までは完了を待つ（0 なら待たない）。
+        """
+        if self._pending:
+            done, _ = wait(list(self._pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for job in done:
+                kind, filename = self._pending.pop(job)
+                if kind == "decode":
+                    _finish_image(filename, job.result())
+                    self.loaded += 1
+                    self._submit_derived(filename)
+                else:
+                    built = job.result()
+                    for key, img in built:
+                        _DERIVED_CACHE[key] = img
+                    self.loaded += len(built)
+        return self.progress
+
+    @property
+    def progress(self) -> float:
+        return self.loaded / self.total if self.total else 1.0
+
+    @property
+    def done(self) -> bool:
+        return not self._pending
+
+    def run(self) -> None:
+        """
+        全部終わるまで待つ（ロード画面を出さない場合）。
+        """
+        self.start()
+        while not self.done:
+            self.poll(timeout=0.1)
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# =========================
+# アセットパック（変換済み画像をまとめた1ファイル）
+# =========================
+ASSET_PACK_FILE = os.path.join(CACHE_DIR, "assets.pack")
+ASSET_PACK_MAGIC = b"KKDPACK\0"
+ASSET_PACK_VERSION = 1
+ASSET_PACK_ALIGN = 64
+ASSET_PACK_FORMAT = "BGRA"  # convert_alpha 後の画面形式（リトルエンディアンの ARGB8888）と同じ並び
+
+_ASSET_PACK_MMAP: list[mmap.mmap] = []  # frombuffer の Surface が参照しているので閉じずに持っておく
+
+def _asset_key_to_json(key: tuple) -> list:
+    return [list(v) if isinstance(v, tuple) else v for v in key]
+
+def _asset_key_from_json(key: list) -> tuple:
+    return tuple(tuple(v) if isinstance(v, list) else v for v in key)
+
+def _asset_source_stamp(filename: str) -> list[int] | None:
+    path = find_asset_path(filename)
+    if path is None:
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def bake_asset_pack(path: str = ASSET_PACK_FILE) -> tuple[int, int]:
+    """
+    asset_manifest() の画像を最終サイズまで変換し、画素（ASSET_PACK_FORMAT）をそのまま1ファイルに並べる。
+    画面（pg.display.set_mode）を作ってから呼ぶ。戻り値は (画像数, ファイルのバイト数)。
+
+    形式: MAGIC(8) + ヘッダ長(uint32 LE) + ヘッダ(JSON) + 画素データ（各画像 ASSET_PACK_ALIGN 境界）
+    ヘッダには元画像のサイズと更新時刻を入れ、元画像が変わった画像は読み込み時に使わない。
+    """
+    manifest = asset_manifest()
+    AssetPreloader(manifest).run()
+
+    entries = []
+    blobs = []
+    offset = 0
+    for key in manifest:
+        img = _IMAGE_CACHE[key[0]] if key[1] == "image" else _DERIVED_CACHE[key]
+        if not img.get_flags() & pg.SRCALPHA:
+            img = img.convert_alpha()  # 不透明画像（背景）は未使用の4バイト目が不定なので、A=255 にそろえる
+        data = pg.image.tobytes(img, ASSET_PACK_FORMAT)
+        pad = -offset % ASSET_PACK_ALIGN
+        blobs.append(b"\0" * pad + data)
+        offset += pad
+        entries.append({"key": _asset_key_to_json(key), "size": list(img.get_size()), "offset": offset})
+        offset += len(data)
+    header = json.dumps({
+        "version": ASSET_PACK_VERSION,
+        "format": ASSET_PACK_FORMAT,
+        "sources": {f: _asset_source_stamp(f) for f in dict.fromkeys(k[0] for k in manifest)},
+        "entries": entries,
+    }, ensure_ascii=False).encode("utf-8")
+    head = ASSET_PACK_MAGIC + struct.pack("<I", len(header)) + header
+    head += b"\0" * (-len(head) % ASSET_PACK_ALIGN)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(head)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+    return len(entries), len(head) + offset
+
+def load_asset_pack(path: str = ASSET_PACK_FILE) -> int:
+    """
+    アセットパックを mmap して、各画像を pg.image.frombuffer で Surface にしてキャッシュに入れる。
+    PNG の展開も縮小もしない。読み込んだ画像数を返す（パックが無い・壊れている・古い場合は 0）。
+
+    - 元画像のサイズ/更新時刻がベイク時と違うファイルの画像は使わない（通常どおり読み込まれる）
+    - 今の asset_manifest() に無い画像（サイズ変更前など）も使わない
+    - mmap はコピーオンライトで開くので、Surface に書き込んでもパックのファイルは変わらない
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError):
+        return 0
+    try:
+        if mm[:len(ASSET_PACK_MAGIC)] != ASSET_PACK_MAGIC:
+            raise ValueError("magic")
+        pos = len(ASSET_PACK_MAGIC)
+        (hlen,) = struct.unpack_from("<I", mm, pos)
+        header = json.loads(mm[pos + 4:pos + 4 + hlen].decode("utf-8"))
+        if header.get("version") != ASSET_PACK_VERSION or header.get("format") != ASSET_PACK_FORMAT:
+            raise ValueError("version")
+    except (ValueError, struct.error):
+        mm.close()
+        return 0
+    base = pos + 4 + hlen
+    base += -base % ASSET_PACK_ALIGN
+
+    wanted = set(asset_manifest())
+    sources = header.get("sources", {})
+    fresh = {f: stamp is not None and stamp == _asset_source_stamp(f) for f, stamp in sources.items()}
+    view = memoryview(mm)
+    count = 0
+    for ent in header.get("entries", []):
+        key = _asset_key_from_json(ent["key"])
+        if key not in wanted or not fresh.get(key[0]) or _is_cached(key):
+            continue
+        w, h = ent["size"]
+        start = base + ent["offset"]
+        img = pg.image.frombuffer(view[start:start + w * h * 4], (w, h), ASSET_PACK_FORMAT)
+        if key[1] == "image":
+            _IMAGE_CACHE[key[0]] = img
+        else:
+            _DERIVED_CACHE[key] = img
+        count += 1
+    if count:
+        _ASSET_PACK_MMAP.append(mm)
+    else:
+        view.release()
+        mm.close()
+    return count
 
-    # ---- 右下UI枠 ----(担当：佐藤)
-    attack_box = pg.Rect(
-        WIDTH - BOX_MARGIN - (BOX_W * 2 + BOX_GAP),  # 右端から「2箱+隙間」ぶん左へ
-        HEIGHT - BOX_MARGIN - BOX_H,                 # 下端から1箱ぶん上へ
-        BOX_W, BOX_H
+# =========================
+# フレーム計測（フェーズ別）
+# =========================
+PROFILE_RING_SIZE = 600   # 約10秒分（60FPS想定）
+PROFILE_AVG_FRAMES = 60   # オーバーレイに出す移動平均のフレーム数
+
+class FrameProfiler:
+    """
+    1フレームをフェーズ（入力・更新・スポーン・当たり判定・描画・HUD・転送・待ち）に分けて時間を測る。
+
+    - lap(phase): 前回の lap からの経過時間を phase に足す（同じフレームで何度呼んでもよい）
+    - end_frame(): そのフレームの値を固定長のリングバッファに書き、csv_path があれば1行書き出す
+    - enabled=False のときは何もしない
+    """
+    PHASES = (
+        "input", "bird", "groups", "spawn", "boss_update", "finalboss_update",
+        "hit_attacks", "hit_items", "hit_bird", "hit_bosses", "hit_finalboss",
+        "draw", "hud", "present", "idle",
     )
-    status_box = pg.Rect(
-        WIDTH - BOX_MARGIN - BOX_W,                  # 右端に寄せる
-        HEIGHT - BOX_MARGIN - BOX_H,
-        BOX_W, BOX_H
+
+    def __init__(self, size: int = PROFILE_RING_SIZE, enabled: bool = True, csv_path: str | None = None):
+        self.enabled = enabled
+        self._size = size
+        self._samples = {p: array("d", [0.0]) * size for p in self.PHASES}
+        self._frames = 0
+        self._cur = dict.fromkeys(self.PHASES, 0.0)
+        self._t = time.perf_counter()
+        self._counts: dict[str, int] = {}
+
+        self._csv_file = None
+        self._csv = None
+        if enabled and csv_path:
+            self._csv_file = open(csv_path, "w", encoding="utf-8", newline="")
+            self._csv = csv.writer(self._csv_file)
+            self._csv_header_written = False
+
+    def begin_frame(self) -> None:
+        if not self.enabled:
+            return
+        for p in self._cur:
+            self._cur[p] = 0.0
+        self._t = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._cur[phase] += now - self._t
+        self._t = now
+
+    def end_frame(self, counts: dict[str, int] | None = None) -> None:
+        if not self.enabled:
+            return
+        i = self._frames % self._size
+        for p, v in self._cur.items():
+            self._samples[p][i] = v * 1000.0
+        self._counts = counts or {}
+        if self._csv is not None:
+            if not self._csv_header_written:
+                self._csv.writerow(["frame"] + [f"{p}_ms" for p in self.PHASES] + list(self._counts))
+                self._csv_header_written = True
+            self._csv.writerow([self._frames] + [f"{self._cur[p] * 1000.0:.4f}" for p in self.PHASES]
+                               + list(self._counts.values()))
+        self._frames += 1
+
+    def averages(self, n: int = PROFILE_AVG_FRAMES) -> dict[str, float]:
+        """
+        直近 n フレームのフェーズ別平均時間（ms）。
+        """
+        n = min(n, self._frames, self._size)
+        if n <= 0:
+            return dict.fromkeys(self.PHASES, 0.0)
+        end = self._frames % self._size
+        idx = [(end - k - 1) % self._size for k in range(n)]
+        return {p: sum(buf[j] for j in idx) / n for p, buf in self._samples.items()}
+
+    def get_counts(self) -> dict[str, int]:
+        return self._counts
+
+    def close(self) -> None:
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv = None
+
+class ProfilerOverlay:
+    """
+    F3 で表示を切り替える計測オーバーレイ（フェーズ別ms・グループ別の数・キャッシュのヒット率）。
+    数値は毎フレーム変わるので、文字キャッシュを汚さないよう REFRESH_FRAMES ごとに直接描き直す。
+    """
+    REFRESH_FRAMES = 15
+    FONT_SIZE = 16
+
+    def __init__(self):
+        self.visible = False
+        self._surf = None
+        self._tick = 0
+
+    def toggle(self) -> None:
+        self.visible = not self.visible
+        self._tick = 0
+
+    def draw(self, screen: pg.Surface, profiler: FrameProfiler) -> pg.Rect | None:
+        """
+        表示中なら左上に描き、描いた範囲を返す。
+        """
+        if not self.visible:
+            return None
+        if self._surf is None or self._tick % self.REFRESH_FRAMES == 0:
+            self._surf = self._build(profiler)
+        self._tick += 1
+        return screen.blit(self._surf, (8, 8))
+
+    def _build(self, profiler: FrameProfiler) -> pg.Surface:
+        font = load_font(self.FONT_SIZE)
+        avg = profiler.averages()
+        total = sum(v for p, v in avg.items() if p != "idle")
+        lines = [f"frame {total:6.2f} ms (+idle {avg['idle']:.2f})"]
+        lines += [f"{p:12s}{v:7.3f}" for p, v in avg.items()]
+        counts = profiler.get_counts()
+        if counts:
+            lines.append(" ".join(f"{k}:{v}" for k, v in counts.items()))
+        text = get_text_cache_stats()
+        derived = get_derived_cache_stats()
+        lines.append(f"text cache {text['hit_rate'] * 100:.1f}%  surf cache {derived['hit_rate'] * 100:.1f}%")
+        lines.append(f"quality {quality('name')}")
+        pools = get_pool_stats()
+        if pools:
+            lines.append("pool " + " ".join(f"{k}:{v['live']}/{v['high_water']}" for k, v in pools.items()))
+
+        line_h = font.get_linesize()
+        width = max(font.size(line)[0] for line in lines) + 12
+        surf = pg.Surface((width, line_h * len(lines) + 8))
+        surf.fill((0, 0, 0))
+        for i, line in enumerate(lines):
+            surf.blit(font.render(line, True, (0, 255, 0)), (6, 4 + i * line_h))
+        return surf
+
+# =========================
+# 画質の自動調整
+# =========================
+# 重い順に落とす段階。上ほど高画質。meteor_cap（ボスの隕石の同時数）は展開が変わるので最後
+QUALITY_LEVELS = (
+    {"name": "high", "ground_line": True, "outline": True, "smooth_scale": True,
+     "explosion_frames": EXPLOSION_FRAMES, "particles": 1.0, "meteor_cap": 0},
+    {"name": "medium", "ground_line": False, "outline": True, "smooth_scale": True,
+     "explosion_frames": EXPLOSION_FRAMES, "particles": 1.0, "meteor_cap": 0},
+    {"name": "low", "ground_line": False, "outline": False, "smooth_scale": False,
+     "explosion_frames": 4, "particles": 0.5, "meteor_cap": 0},
+    {"name": "lowest", "ground_line": False, "outline": False, "smooth_scale": False,
+     "explosion_frames": 4, "particles": 0.25, "meteor_cap": 3},
 )
+FRAME_BUDGET_MS = 1000 / FPS  # 1ステップぶんの時間で描画まで終わっていれば間に合っている
+QUALITY_WINDOW = 60           # 判定に使う直近の描画フレーム数（判定したら数え直す）
+QUALITY_UP_RATIO = 0.6        # 平均が予算のこの割合に収まる判定が
+QUALITY_UP_WINDOWS = 3        # これだけ続いたら1段上げる（下げるのは1回で下げる）
 
-    # ---- UIアイコン（アイテム画像を流用）----(担当：佐藤)
-    UI_ICONS = {}
-    for k, idef in ITEM_DEFS.items():
-        try:
-            icon = load_image(idef.get_img_file())
-            icon = pg.transform.smoothscale(icon, (40, 40))
-            UI_ICONS[k] = icon
-        except:
-            # ファイル不一致の場合はダミー（落とさない）
-            surf = pg.Surface((40, 40))
-            surf.fill((80, 80, 80))
-            UI_ICONS[k] = surf
-
-    # ---- 中ボス管理 ----
-    tmr = 0
-    mid_boss_spawned = False
-    mid_boss_defeated = False
-    last_score = None
-    score_surf = None
-    score_pos = (0, 0)
-
-    def make_outlined_text(font, text, text_color, outline_color, outline_px=2):
-        base = font.render(text, True, text_color)
-        w, h = base.get_width() + outline_px*2, base.get_height() + outline_px*2
-        surf = pg.Surface((w, h), pg.SRCALPHA)
-        for dx in range(-outline_px, outline_px + 1):
-            for dy in range(-outline_px, outline_px + 1):
-                if dx == 0 and dy == 0:
+_QUALITY = QUALITY_LEVELS[0]
+
+def quality(key: str):
+    """
+    今の画質の設定値（QUALITY_LEVELS の項目）。
+    """
+    return _QUALITY[key]
+
+def set_quality_level(level: int) -> None:
+    global _QUALITY
+    _QUALITY = QUALITY_LEVELS[level]
+
+class QualityGovernor:
+    """
+    直近のフレーム時間（描画の待ちを除いた処理時間）を見て画質の段階を上げ下げする。
+
+    - QUALITY_WINDOW フレームの平均が FRAME_BUDGET_MS を超えたら1段下げる
+    - 平均が予算の QUALITY_UP_RATIO 以下の判定が QUALITY_UP_WINDOWS 回続いたら1段上げる
+    - 切り替えるたびに log に1行出す（どの端末がどの画質で動いているかを見るため）
+    auto=False なら level のまま変えない。
+    """
+    def __init__(self, level: int = 0, auto: bool = True, budget_ms: float = FRAME_BUDGET_MS,
+                 window: int = QUALITY_WINDOW, log=print):
+        self.auto = auto
+        self.budget_ms = budget_ms
+        self._window = window
+        self._log = log
+        self._sum = 0.0
+        self._n = 0
+        self._good = 0
+        self._t0 = time.perf_counter()
+        self.level = level
+        set_quality_level(level)
+
+    def setting(self, key: str):
+        return QUALITY_LEVELS[self.level][key]
+
+    def observe(self, busy_ms: float) -> None:
+        """
+        1フレームの処理時間を渡す。判定の区切りで必要なら画質を切り替える。
+        """
+        if not self.auto:
+            return
+        self._sum += busy_ms
+        self._n += 1
+        if self._n < self._window:
+            return
+        avg = self._sum / self._n
+        self._sum = 0.0
+        self._n = 0
+        if avg > self.budget_ms:
+            self._good = 0
+            if self.level < len(QUALITY_LEVELS) - 1:
+                self._switch(self.level + 1, avg)
+        elif avg <= self.budget_ms * QUALITY_UP_RATIO:
+            self._good += 1
+            if self._good >= QUALITY_UP_WINDOWS and self.level > 0:
+                self._good = 0
+                self._switch(self.level - 1, avg)
+        else:
+            self._good = 0
+
+    def _switch(self, level: int, avg_ms: float) -> None:
+        old = QUALITY_LEVELS[self.level]["name"]
+        self.level = level
+        set_quality_level(level)
+        self._log(f"[quality] {time.perf_counter() - self._t0:7.1f}s {old} -> {QUALITY_LEVELS[level]['name']}"
+                  f" (avg {avg_ms:.1f} ms / budget {self.budget_ms:.1f} ms)")
+
+# =========================
+# 当たり判定（空間ハッシュ）
+# =========================
+COLLISION_CELL_PX = 128  # スプライトの大きさ（50〜300px）に合わせたマス目の一辺
+COLLISION_GRID_MIN = 32  # これより少ないグループは索引を作らず総当たりの方が速い
+
+class CollisionWorld:
+    """
+    一様グリッドの空間ハッシュで当たり判定の候補を絞る。
+
+    - begin_frame() でそのフレームの索引を捨てる（移動・スポーンが終わった後に呼ぶ）
+    - 各グループの索引は、そのフレームで最初に問い合わせたときに1回だけ作る
+    - COLLISION_GRID_MIN 体未満のグループは索引を作らず総当たりで調べる
+    - spritecollide / groupcollide は pg.sprite の同名関数と同じ結果（順序・kill の扱いも同じ）を返す
+
+    索引を作った後で kill されたスプライトは所属チェックで除くので、
+    同じフレーム内で dokill=True の問い合わせを続けても結果は変わらない。
+    """
+    def __init__(self, cell: int = COLLISION_CELL_PX):
+        self._cell = cell
+        self._grids: dict[pg.sprite.AbstractGroup, tuple[dict, dict]] = {}
+
+    def begin_frame(self) -> None:
+        self._grids.clear()
+
+    def _cell_range(self, rect: pg.Rect) -> tuple[range, range] | None:
+        """
+        rect が掛かるマス目の x, y の範囲。大きさ0の Rect は何とも衝突しない（pygame と同じ）ので None。
+        """
+        w, h = rect.width, rect.height
+        if w <= 0 or h <= 0:
+            return None
+        c = self._cell
+        x, y = rect.x, rect.y
+        return range(x // c, (x + w - 1) // c + 1), range(y // c, (y + h - 1) // c + 1)
+
+    def _grid(self, group: pg.sprite.AbstractGroup) -> tuple[dict, dict]:
+        grid = self._grids.get(group)
+        if grid is None:
+            cells: dict[tuple[int, int], list[pg.sprite.Sprite]] = {}
+            order: dict[pg.sprite.Sprite, int] = {}
+            for i, spr in enumerate(group):
+                order[spr] = i
+                span = self._cell_range(spr.rect)
+                if span is None:
+                    continue
+                for cx in span[0]:
+                    for cy in span[1]:
+                        lst = cells.get((cx, cy))
+                        if lst is None:
+                            cells[(cx, cy)] = [spr]
+                        else:
+                            lst.append(spr)
+            grid = (cells, order)
+            self._grids[group] = grid
+        return grid
+
+    def _query(self, rect: pg.Rect, group: pg.sprite.AbstractGroup) -> list:
+        """
+        rect と重なる group のスプライトを、グループの並び順で返す（kill はしない）。
+        """
+        if group not in self._grids and len(group) < COLLISION_GRID_MIN:
+            return [spr for spr in group if rect.colliderect(spr.rect)]
+
+        cells, order = self._grid(group)
+        span = self._cell_range(rect)
+        if span is None:
+            return []
+        members = group.spritedict  # 索引を作った後に kill されたものを除く
+        colliderect = rect.colliderect
+        seen = set()
+        hits = []
+        lists = 0
+        for cx in span[0]:
+            for cy in span[1]:
+                lst = cells.get((cx, cy))
+                if lst is None:
                     continue
-                surf.blit(font.render(text, True, outline_color), (dx + outline_px, dy + outline_px))
-        surf.blit(base, (outline_px, outline_px))
+                lists += 1
+                for spr in lst:
+                    if spr in seen:
+                        continue
+                    seen.add(spr)
+                    if spr in members and colliderect(spr.rect):
+                        hits.append(spr)
+        if lists > 1:
+            hits.sort(key=order.__getitem__)  # 各マスの中は並び順どおりなので、複数マスのときだけ並べ直す
+        return hits
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, group: pg.sprite.AbstractGroup, dokill: bool) -> list:
+        hits = self._query(sprite.rect, group)
+        if dokill:
+            for spr in hits:
+                spr.kill()
+        return hits
+
+    def groupcollide(self, groupa: pg.sprite.AbstractGroup, groupb: pg.sprite.AbstractGroup,
+                     dokilla: bool, dokillb: bool) -> dict:
+        """
+        pg.sprite.groupcollide と同じ結果を返す。数の少ない側から多い側の索引を引く。
+
+        dokillb=True のとき、b の各スプライトは「a の並び順で最初に重なった1体」だけに当たる
+        （pygame が a の順に調べて当たった b をその場で消すのと同じ）。
+        """
+        crashed = {}
+        if len(groupa) <= len(groupb):
+            for spr in groupa.sprites():
+                hits = self.spritecollide(spr, groupb, dokillb)
+                if hits:
+                    crashed[spr] = hits
+                    if dokilla:
+                        spr.kill()
+            return crashed
+
+        owners: dict[pg.sprite.Sprite, list] = {}
+        for spr_b in groupb.sprites():
+            hits_a = self._query(spr_b.rect, groupa)
+            if not hits_a:
+                continue
+            if dokillb:
+                hits_a = hits_a[:1]
+            for spr_a in hits_a:
+                owners.setdefault(spr_a, []).append(spr_b)
+        if not owners:
+            return crashed
+
+        order_a = {spr: i for i, spr in enumerate(groupa)}
+        for spr_a in sorted(owners, key=order_a.__getitem__):
+            crashed[spr_a] = owners[spr_a]
+        for spr_a, hits in crashed.items():
+            if dokillb:
+                for spr_b in hits:
+                    spr_b.kill()
+            if dokilla:
+                spr_a.kill()
+        return crashed
+
+# =========================
+# 弾幕（配列でまとめて持つ弾）
+# =========================
+BARRAGE_SIZES = (12, 16, 24)   # 弾の大きさ(px)。spawn の size_idx はこの添字
+BARRAGE_COLOR = (255, 90, 200)
+BARRAGE_HITBOX = 0.6           # 見た目の半径に対する当たり判定の割合（弾幕なので小さめ）
+BARRAGE_DMG = 5                # 1発のダメージ（無敵時間は通常と同じ）
+
+def orb_image(size: int, color: tuple[int, int, int]) -> pg.Surface:
+    """
+    弾幕の弾（光る丸）。変換済みSurfaceキャッシュに載せるので大きさ・色ごとに1回だけ作る。
+    """
+    def build():
+        surf = pg.Surface((size, size), pg.SRCALPHA)
+        r = size // 2
+        pg.draw.circle(surf, (*color, 110), (r, r), r)
+        pg.draw.circle(surf, (*color, 255), (r, r), max(1, r * 2 // 3))
+        pg.draw.circle(surf, (255, 255, 255, 255), (r, r), max(1, r // 3))
         return surf
-    
-    state_timer = 0
+    return _get_derived(("orb", size, color), build)
 
-    mid_boss_spawned = False
-    mid_boss_defeated = False
+class ProjectileField:
+    """
+    弾幕用の弾。1発ずつスプライトにはせず、位置・速度・大きさ・寿命を NumPy 配列で持つ。
 
-    final_stage = False
-    final_boss_spawned = False
-    final_boss_defeated = False
+    - update() で全弾を一度に動かし、寿命切れ・画面外の弾を詰めて消す
+    - hit_rect(rect) で矩形に当たった弾をまとめて判定して消す
+    - draw(screen) は大きさごとに Surface.blits を1回ずつ呼ぶ
+    numpy が無い環境では enabled が False になり、spawn しても弾は出ない。
+    """
+    MARGIN = 32  # 画面外に出てから消すまでの余白(px)
+
+    def __init__(self, sizes: tuple[int, ...] = BARRAGE_SIZES,
+                 color: tuple[int, int, int] = BARRAGE_COLOR, capacity: int = 1024):
+        self.enabled = np is not None
+        self._sizes = tuple(sizes)
+        self._color = color
+        self.n = 0
+        if self.enabled:
+            self._half = np.array(self._sizes, dtype=np.float32) / 2
+            self._alloc(capacity)
+
+    def _alloc(self, capacity: int) -> None:
+        old = getattr(self, "_x", None)
+        x = np.zeros(capacity, np.float32)
+        y = np.zeros(capacity, np.float32)
+        vx = np.zeros(capacity, np.float32)
+        vy = np.zeros(capacity, np.float32)
+        size = np.zeros(capacity, np.uint8)
+        life = np.zeros(capacity, np.int32)
+        if old is not None:
+            n = self.n
+            x[:n], y[:n], vx[:n], vy[:n] = self._x[:n], self._y[:n], self._vx[:n], self._vy[:n]
+            size[:n], life[:n] = self._size[:n], self._life[:n]
+        self._x, self._y, self._vx, self._vy, self._size, self._life = x, y, vx, vy, size, life
+
+    def __len__(self) -> int:
+        return self.n
+
+    def clear(self) -> None:
+        self.n = 0
+
+    def spawn(self, x, y, vx, vy, size_idx: int = 0, life: int = 600) -> None:
+        """
+        弾を追加する。x, y, vx, vy はスカラーでも配列でもよい（長さをそろえて何発でも）。
+        """
+        if not self.enabled:
+            return
+        k = np.broadcast(x, y, vx, vy).size
+        n = self.n
+        if n + k > len(self._x):
+            self._alloc(max(len(self._x) * 2, n + k))
+        s = slice(n, n + k)
+        self._x[s] = x
+        self._y[s] = y
+        self._vx[s] = vx
+        self._vy[s] = vy
+        self._size[s] = size_idx
+        self._life[s] = life
+        self.n = n + k
+
+    def emit_ring(self, center: tuple[int, int], count: int, speed: float, phase_deg: float,
+                  size_idx: int = 0, life: int = 600) -> None:
+        """
+        center から count 発を等間隔の向きに撃つ（phase_deg で全体を回す）。
+        """
+        if not self.enabled:
+            return
+        a = np.radians(phase_deg) + np.arange(count) * (2 * math.pi / count)
+        self.spawn(center[0], center[1], np.cos(a) * speed, np.sin(a) * speed, size_idx, life)
 
-    while True:
-        key_lst = pg.key.get_pressed()
+    def _compact(self, keep) -> None:
+        idx = np.flatnonzero(keep)
+        k = len(idx)
+        n = self.n
+        for arr in (self._x, self._y, self._vx, self._vy, self._size, self._life):
+            arr[:k] = arr[:n][idx]
+        self.n = k
 
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                return
+    def update(self) -> None:
+        n = self.n
+        if n == 0:
+            return
+        x = self._x[:n]
+        y = self._y[:n]
+        life = self._life[:n]
+        x += self._vx[:n]
+        y += self._vy[:n]
+        life -= 1
+        m = self.MARGIN
+        keep = (life > 0) & (x > -m) & (x < WIDTH + m) & (y > -m) & (y < HEIGHT + m)
+        if not keep.all():
+            self._compact(keep)
+
+    def hit_rect(self, rect: pg.Rect, remove: bool = True) -> int:
+        """
+        rect に当たっている弾の数を返す。remove=True なら当たった弾は消す。
+        """
+        n = self.n
+        if n == 0:
+            return 0
+        x = self._x[:n]
+        y = self._y[:n]
+        r = self._half[self._size[:n]] * BARRAGE_HITBOX
+        hit = (x + r > rect.left) & (x - r < rect.right) & (y + r > rect.top) & (y - r < rect.bottom)
+        k = int(np.count_nonzero(hit))
+        if k and remove:
+            self._compact(~hit)
+        return k
+
+    def draw(self, screen: pg.Surface, alpha: float = 1.0, scale: tuple[float, float] = (1.0, 1.0)) -> None:
+        """
+        alpha < 1 なら前のステップとの間の位置（速度ぶん戻した所）に描く。
+        scale は内部解像度で描くときの縮小率 (sx, sy)（位置と弾の大きさに掛ける）。
+        """
+        n = self.n
+        if n == 0:
+            return
+        x = self._x[:n]
+        y = self._y[:n]
+        if alpha < 1.0:
+            back = 1.0 - alpha
+            x = x - self._vx[:n] * back
+            y = y - self._vy[:n] * back
+        sx, sy = scale
+        if sx != 1.0 or sy != 1.0:
+            x = x * sx
+            y = y * sy
+        xi = x.astype(np.int32)
+        yi = y.astype(np.int32)
+        size = self._size[:n]
+        for s, px in enumerate(self._sizes):
+            sel = size == s
+            if not sel.any():
+                continue
+            px = max(2, round(px * sx))
+            h = px // 2
+            pts = np.column_stack((xi[sel] - h, yi[sel] - h)).tolist()
+            screen.blits(zip(repeat(orb_image(px, self._color)), pts), doreturn=False)
+
+    def digest(self) -> tuple[int, int]:
+        """
+        (弾数, 位置のCRC32)。状態チェックサム用。
+        """
+        n = self.n
+        if n == 0:
+            return (0, 0)
+        return (n, zlib.crc32(self._x[:n].tobytes() + self._y[:n].tobytes()))
 
-            if event.type == pg.KEYDOWN:
-                if game_state == STATE_START:
-                    if event.key == pg.K_RETURN:
-                        game_state = STATE_PLAY
-                        tmr = 0
-                        bird.hp = HP_MAX
-                        enemies.empty()
-                        items.empty()
-                        beams.empty()
-                        arrows.empty()
-                        exps.empty()
-                        midboss_group.empty()
-                        beams_tbos.empty()
-                        meteors.empty()
-                        boss_meteors.empty()
-                        mid_boss_spawned = False
-                        mid_boss_defeated = False
-
-                elif game_state == STATE_PLAY:
-                    if event.key == pg.K_UP:
-                        bird.try_jump()
-                    if event.key == pg.K_ESCAPE:
-                        return
-                    if event.key == pg.K_SPACE:
-                        atk_id = inv.get_attack()
-                        d = bird.get_dir()  # +1 or -1
-
-                        # 発射位置：右向きなら右手、左向きなら左手
-                        if d == +1:
-                            start = (bird.get_rect().right + 30, bird.get_rect().centery)
-                        else:
-                            start = (bird.get_rect().left - 30, bird.get_rect().centery)
+# =========================
+# パーティクル（爆発の破片）
+# =========================
+PARTICLE_COLOR = (255, 190, 70)
+PARTICLE_FADE_STEPS = 6    # 寿命を何段階の絵（だんだん小さく薄く）で見せるか
+PARTICLE_GRAVITY = 0.25
+PARTICLE_DRAG = 0.96       # 1ステップごとに速度に掛ける
+PARTICLE_BURST = 32        # モブ敵1体の撃破で出す数
+PARTICLE_SPARK = 6         # ボスに当てたときに出す数
+
+def spark_image(step: int, color: tuple[int, int, int] = PARTICLE_COLOR, scale: float = 1.0) -> pg.Surface:
+    """
+    破片の絵（step = 0 が出たて、PARTICLE_FADE_STEPS - 1 が消える直前）。キャッシュに大きさごとに1回だけ作る。
+    scale は内部解像度で描くときの縮小率（半径に掛ける）。
+    """
+    t = step / max(1, PARTICLE_FADE_STEPS - 1)
+    r = max(1, round((4 - 3 * t) * scale))
 
-                        if atk_id == "Beam":
-                            beams.add(Beam(start, direction=d))
-                        elif atk_id == "arrow":
-                            arrows.add(Arrow(start, direction=d))
+    def build():
+        surf = pg.Surface((r * 2, r * 2), pg.SRCALPHA)
+        pg.draw.circle(surf, (*color, round(255 - 190 * t)), (r, r), r)
+        return surf
+    return _get_derived(("spark", step, color, r), build)
 
-        # ---------- 描画クリア ----------
-        screen.fill((0, 0, 0))
+class ParticleField:
+    """
+    見た目だけの破片。ProjectileField と同じく位置・速度・寿命を NumPy 配列で持つ。
 
-        # ---------- 状態別 ----------
-        if game_state == STATE_START:
-            draw_start_screen(screen)
+    - burst(center, count) で一度に何十〜何百個でも出せる（向き・速さ・寿命は専用の乱数で決める）
+    - update() は全破片を1回の配列計算で動かし、寿命切れを詰めて消す
+    - draw() は寿命の段階ごとに Surface.blits を1回ずつ呼ぶ（数が増えても呼び出し回数は一定）
+    ゲームの random を使わず状態チェックサムにも入れないので、出しても展開は変わらない。
+    numpy が無い環境では enabled が False になり、何も出ない。
+    """
+    def __init__(self, seed: int = 0, capacity: int = 1024):
+        self.enabled = np is not None
+        self.n = 0
+        if self.enabled:
+            self._rng = np.random.default_rng(seed)
+            self._alloc(capacity)
+
+    def _alloc(self, capacity: int) -> None:
+        old = getattr(self, "_x", None)
+        arrs = [np.zeros(capacity, np.float32) for _ in range(4)] + [np.zeros(capacity, np.int32) for _ in range(2)]
+        if old is not None:
+            n = self.n
+            for new, cur in zip(arrs, self._arrays()):
+                new[:n] = cur[:n]
+        self._x, self._y, self._vx, self._vy, self._life, self._life0 = arrs
+
+    def _arrays(self):
+        return (self._x, self._y, self._vx, self._vy, self._life, self._life0)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def clear(self) -> None:
+        self.n = 0
+
+    def burst(self, center: tuple[int, int], count: int, speed: tuple[float, float] = (2.0, 7.0),
+              life: tuple[int, int] = (18, 36)) -> None:
+        """
+        center から count 個を全方向に飛ばす（画質を下げている間は quality("particles") 倍に減らす）。
+        """
+        if not self.enabled:
+            return
+        k = int(count * quality("particles"))
+        if k <= 0:
+            return
+        n = self.n
+        if n + k > len(self._x):
+            self._alloc(max(len(self._x) * 2, n + k))
+        rng = self._rng
+        a = rng.uniform(0.0, 2 * math.pi, k)
+        v = rng.uniform(speed[0], speed[1], k)
+        s = slice(n, n + k)
+        self._x[s] = center[0]
+        self._y[s] = center[1]
+        self._vx[s] = np.cos(a) * v
+        self._vy[s] = np.sin(a) * v - 2.0  # 少し上向きに跳ねる
+        self._life[s] = self._life0[s] = rng.integers(life[0], life[1] + 1, k)
+        self.n = n + k
 
-        elif game_state == STATE_PLAY:
-            # 背景 & 地面
-            bg.update(screen)
-            if DEBUG_DRAW_GROUND_LINE:
-                pg.draw.line(screen, (0, 0, 0), (0, get_ground_y()), (WIDTH, get_ground_y()), 2)
-
-            # --- 更新 ---
-            bird.update(key_lst, screen)
-            enemies.update()
-            items.update()
-            beams.update()
-            arrows.update()
-            exps.update()
-            boss_meteors.update()
-
-            # --- 敵スポーン（中ボス前だけ）---
-            if (not mid_boss_spawned) and (not final_boss_spawned):
-                spawn_interval = params["spawn_interval"]
-                spawn_prob = 0.93  # ステージ1の基準
-
-                # 最終ステージは「第一ステージより少し多め」
-                if stage == 2:
-                    spawn_interval = max(20, int(spawn_interval * 0.8))  # 間隔を短くして増やす
-                    spawn_prob = 0.96                                   # 確率も少し上げる
-
-                if tmr % spawn_interval == 0 and random.random() < spawn_prob:
-                    spawn_enemy(enemies, stage)
-
-            # --- 中ボス出現条件 ---
-            if score > 250 and (not mid_boss_spawned) and (not mid_boss_defeated):
-                mid_boss_spawned = True
-                enemies.empty()
-                midboss_group.add(MidBoss())
-
-            # --- 最終Boss出現条件（最終ステージ中 && Score 1500到達）---
-            if final_stage and (not final_boss_spawned) and (not final_boss_defeated) and score >= FINAL_BOSS_SCORE:
-                final_boss_spawned = True
-
-                enemies.empty()  # モブ消す（要件：出現止まる＋邪魔なら消す）
-                beams.empty()
-                arrows.empty()
-
-                b = Boss()
-                b.hp = FINAL_BOSS_HP
-                finalboss_group.add(b)
-
-            # --- アイテムスポーン ---
-            maybe_spawn_item(tmr, stage, ITEM_DEFS, items)
-
-            # 中ボス更新
-            if mid_boss_spawned and len(midboss_group.sprites()) > 0:
-                midboss_group.update(bird.get_rect(), beams_tbos, meteors)
-                beams_tbos.update()
-                meteors.update()
-
-            # --- 当たり判定：攻撃 → 敵 ---
-            hit1 = pg.sprite.groupcollide(enemies, beams, True, True)
-            for emy in hit1.keys():
-                exps.add(Explosion(emy.rect.center, life=30))
-                score += random.randint(10, 20)
-
-            hit2 = pg.sprite.groupcollide(enemies, arrows, True, True)
-            for emy in hit2.keys():
-                exps.add(Explosion(emy.rect.center, life=30))
-                score += random.randint(10, 20)
-
-            # --- 当たり判定：アイテム取得 ---
-            picked = pg.sprite.spritecollide(bird, items, True)
-            for it in picked:
-                item_id = it.get_item_id()
-                cat = ITEM_DEFS[item_id].get_category()
-                if cat == "attack":
-                    inv.pickup_attack(item_id)
-                else:
-                    apply_status_pickup(item_id, inv, bird)
+    def update(self) -> None:
+        n = self.n
+        if n == 0:
+            return
+        vx = self._vx[:n]
+        vy = self._vy[:n]
+        vy += PARTICLE_GRAVITY
+        vx *= PARTICLE_DRAG
+        vy *= PARTICLE_DRAG
+        self._x[:n] += vx
+        self._y[:n] += vy
+        life = self._life[:n]
+        life -= 1
+        keep = life > 0
+        if not keep.all():
+            idx = np.flatnonzero(keep)
+            for arr in self._arrays():
+                arr[:len(idx)] = arr[:n][idx]
+            self.n = len(idx)
+
+    def draw(self, screen: pg.Surface, alpha: float = 1.0, scale: tuple[float, float] = (1.0, 1.0)) -> None:
+        """
+        alpha < 1 なら前のステップとの間の位置に、scale は内部解像度で描くときの縮小率（位置と破片の大きさに掛ける）。
+        """
+        n = self.n
+        if n == 0:
+            return
+        x = self._x[:n]
+        y = self._y[:n]
+        if alpha < 1.0:
+            back = 1.0 - alpha
+            x = x - self._vx[:n] * back
+            y = y - self._vy[:n] * back
+        sx, sy = scale
+        xi = (x * sx).astype(np.int32)
+        yi = (y * sy).astype(np.int32)
+        steps = PARTICLE_FADE_STEPS
+        stage = ((self._life0[:n] - self._life[:n]) * steps) // self._life0[:n]
+        for k in range(steps):
+            sel = stage == k
+            if not sel.any():
+                continue
+            img = spark_image(k, PARTICLE_COLOR, sx)
+            h = img.get_width() // 2
+            pts = np.column_stack((xi[sel] - h, yi[sel] - h)).tolist()
+            screen.blits(zip(repeat(img), pts), doreturn=False)
 
-            # --- 当たり判定：敵接触ダメージ（HPはbirdに統一）---
-            if pg.sprite.spritecollide(bird, enemies, False):
-                bird.take_damage(DMG)
-                bird.set_damage()  # 点滅
-                # 接触してる敵は消す（好みで）
-                for e in pg.sprite.spritecollide(bird, enemies, True):
-                    pass
+# =========================
+# ゲーム進行（描画なし）
+# =========================
+class FrameInput:
+    """
+    1フレーム分の入力。
 
-            # --- 当たり判定：中ボス攻撃物 ---
-            if pg.sprite.spritecollide(bird, beams_tbos, True):
-                bird.take_damage(DMG)
-                bird.set_damage()
-            if pg.sprite.spritecollide(bird, meteors, True):
-                bird.take_damage(DMG)
+    - pressed: 押しっぱなしのキー（pg.K_LEFT / pg.K_RIGHT）の状態
+    - keydowns: このフレームで押されたキー（KEYDOWN の key）の並び
+    - meteor_cap: ボスの隕石の同時数の上限（0 なら無制限）。画質の自動調整が決めるが、
+      展開が変わるので入力として記録・再生する
+    """
+    HELD_KEYS = (pg.K_LEFT, pg.K_RIGHT)
+
+    def __init__(self, left: bool = False, right: bool = False, keydowns: tuple[int, ...] = (),
+                 meteor_cap: int = 0):
+        self.pressed = {pg.K_LEFT: bool(left), pg.K_RIGHT: bool(right)}
+        self.keydowns = tuple(keydowns)
+        self.meteor_cap = int(meteor_cap)
+
+    @classmethod
+    def from_pygame(cls, key_lst, events) -> "FrameInput":
+        """
+        pg.key.get_pressed() と pg.event.get() の結果から作る。
+        """
+        keydowns = tuple(e.key for e in events if e.type == pg.KEYDOWN)
+        return cls(key_lst[pg.K_LEFT], key_lst[pg.K_RIGHT], keydowns)
+
+def _stage_image_keys(stage: int, render_size: tuple[int, int] | None) -> list[tuple]:
+    """
+    ステージの切り替えで使う変換済み画像のキー（背景と、そのステージの敵）。
+    """
+    bg_file = stage_params(stage)["bg_file"]
+    keys = [(bg_file, "scale", (WIDTH, HEIGHT))]
+    if render_size is not None:
+        keys.append((bg_file, "scale", tuple(render_size)))
+    for kind in ("ground", "air"):
+        keys.append((enemy_image_file(stage, kind), "rotozoom", 0.0, ENEMY_SCALE))
+    return keys
+
+def _prepare_stage(stage: int, ready: dict[tuple, pg.Surface], sources: dict[str, pg.Surface],
+                   render_size: tuple[int, int] | None):
+    """
+    ステージの背景（帯・地面の高さ）と、足りない敵画像を作る（ワーカースレッドで呼ぶ）。
+
+    キャッシュには触らない。ready（キャッシュにあった変換済み画像）と sources（読み込み済みの元画像）は
+    メインスレッドで写しておいたもので、足りない元画像はここで読み込むだけ（画面形式への変換はしない）。
+    作ったものは (Background, 読み込んだ元画像, 作った変換済み画像) で返し、StagePrefetcher.take が
+    メインスレッドでキャッシュに入れる。（乱数は使わないので、どのスレッドで作っても展開は変わらない）
+    """
+    by_file: dict[str, list[tuple]] = {}
+    for key in _stage_image_keys(stage, render_size):
+        if key not in ready:
+            by_file.setdefault(key[0], []).append(key)
+    decoded = {}
+    built = {}
+    for filename, keys in by_file.items():
+        src = sources.get(filename)
+        if src is None:
+            src = decoded[filename] = _decode_image(filename)
+        built.update(_build_derived(src, keys))
+
+    params = stage_params(stage)
+    bg_file = params["bg_file"]
+    scaled = lambda size: ready.get((bg_file, "scale", size)) or built[(bg_file, "scale", size)]
+    bg = Background.prepare(bg_file, params["bg_speed"], params.get("ground", "flat"), scaled)
+    if render_size is not None:
+        bg.prepare_size(render_size)
+    return bg, decoded, built
+
+class StagePrefetcher:
+    """
+    次のステージの準備（_prepare_stage）をワーカースレッドで先に進めておく。
+
+    start(stage) は遷移画面に入ったときに呼ぶ。take(stage) は切り替えのフレームで呼び、
+    できあがった Background を返す（まだなら終わるまで待つ）。ステージが違えば None。
+    start / take / close はメインスレッドで呼ぶ。キャッシュへの書き込みは take だけが行う。
+    """
+    def __init__(self):
+        self._executor: ThreadPoolExecutor | None = None
+        self._future = None
+        self._stage: int | None = None
+
+    def start(self, stage: int) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stage")
+        keys = _stage_image_keys(stage, _RENDER_SIZE)
+        ready = {k: _DERIVED_CACHE[k] for k in keys if k in _DERIVED_CACHE}
+        sources = {k[0]: _IMAGE_CACHE[k[0]] for k in keys if k[0] in _IMAGE_CACHE}
+        self._stage = stage
+        self._future = self._executor.submit(_prepare_stage, stage, ready, sources, _RENDER_SIZE)
+
+    def take(self, stage: int) -> Background | None:
+        if self._future is None or self._stage != stage:
+            return None
+        future, self._future, self._stage = self._future, None, None
+        bg, decoded, built = future.result()
+        for filename, img in decoded.items():
+            if filename not in _IMAGE_CACHE:
+                _finish_image(filename, img)
+        for key, img in built.items():
+            if key not in _DERIVED_CACHE:
+                # 変換していない元画像から作ったものは、ここで画面形式にそろえる
+                _DERIVED_CACHE[key] = _to_display_format(key[0], img) if key[0] in decoded else img
+        return bg
+
+    def close(self) -> None:
+        """
+        先読みをやめてワーカースレッドを止める（終わるのは待たない）。
+        """
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+            self._stage = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+class GameSim:
+    """
+    ゲームの状態（グループ・スコア・ステージ・ボスの進行・所持品）と1フレームの進行。
+
+    step(inputs) は画面（display）を使わないので、SDL_VIDEODRIVER=dummy でも
+    FPS の制限なしに回せる。描画は GameRenderer が、この状態を読んで行う。
+
+    敵・隕石・アイテム・ボスは random モジュールを使うので、seed を渡すと
+    同じ入力列から毎回同じ展開になる（入力の記録・再生用）。
+    """
+    def __init__(self, seed: int | None = None, profiler: FrameProfiler | None = None):
+        # ---- フェーズ別計測（無ければ何もしない計測器）----
+        self.profiler = profiler if profiler is not None else FrameProfiler(size=1, enabled=False)
+
+        # ---- 乱数（記録・再生のため種を覚えておく）----
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        random.seed(self.seed)
+
+        # ---- 状態 ----
+        self.game_state = STATE_START
+        self.state_timer = 0
+        self.tmr = 0
+        self.quit_requested = False
+
+        # ---- ステージ ----
+        self.stage = 1
+        self.params = stage_params(self.stage)
+        self.bg = Background(self.params["bg_file"], self.params["bg_speed"], self.params.get("ground", "flat"))
+
+        # ---- プレイヤー ----
+        self.bird = Bird(3, (200, get_ground_y()))
+        self.bird.hp = HP_MAX  # HPをbird.hpに統一
+
+        # ---- スコア ----
+        self.score = 0
+
+        # ---- グループ ----
+        self.enemies = pg.sprite.Group()
+        self.items = pg.sprite.Group()
+        self.beams = pg.sprite.Group()
+        self.arrows = pg.sprite.Group()
+        self.exps = pg.sprite.Group()
+
+        self.midboss_group = pg.sprite.Group()
+        self.boss_meteors = pg.sprite.Group()
+        self.finalboss_group = pg.sprite.Group()
+        self.beams_tbos = pg.sprite.Group()
+        self.meteors = pg.sprite.Group()
+        self.barrage = ProjectileField()  # ボスの弾幕（スプライトではなく配列）
+        self.particles = ParticleField(seed=self.seed)  # 爆発の破片（見た目だけ）
+
+        # ---- アイテム定義 ----
+        self.item_defs = default_item_defs()
+        self.inv = Inventory(self.item_defs)
+
+        # ---- 当たり判定の索引（毎フレーム作り直す）----
+        self.world = CollisionWorld()
+
+        # ---- 敵・アイテム・ボス出現の予定（ステージ開始時に作り直す）----
+        self.timeline = Timeline(self.params["timeline"])
+
+        # ---- 次ステージの先読み（遷移画面の間にワーカーで作る）----
+        self.prefetch = StagePrefetcher()
+
+        # ---- 中ボス・最終ボス管理 ----
+        self.mid_boss_spawned = False
+        self.mid_boss_defeated = False
+
+        self.final_stage = False
+        self.final_boss_spawned = False
+        self.final_boss_defeated = False
+
+    def step(self, inputs: FrameInput) -> None:
+        """
+        入力を1フレーム分適用してゲームを進める。
+        """
+        self._handle_keydowns(inputs.keydowns)
+        self.profiler.lap("input")
+        if self.quit_requested:
+            return
+
+        if self.game_state == STATE_PLAY:
+            self._step_play(inputs)
+        elif self.game_state == STATE_TO_FINAL:
+            self._step_to_final()
+
+    def entity_counts(self) -> dict[str, int]:
+        """
+        グループ別のスプライト数（計測表示用）。
+        """
+        return {
+            "enemies": len(self.enemies), "items": len(self.items), "beams": len(self.beams),
+            "arrows": len(self.arrows), "exps": len(self.exps), "beams_tbos": len(self.beams_tbos),
+            "meteors": len(self.meteors), "boss_meteors": len(self.boss_meteors),
+            "barrage": len(self.barrage), "particles": len(self.particles),
+        }
+
+    def state_checksum(self) -> int:
+        """
+        ゲーム状態の要約（CRC32）。記録時と再生時で値が違えばそのフレームで展開がずれている。
+        """
+        bird = self.bird
+        parts = [
+            self.game_state, self.stage, self.tmr, self.state_timer, self.score,
+            tuple(bird.rect), bird.hp, bird.get_vy(), bird.get_max_jump(),
+            self.inv.get_attack(), self.inv.get_status(),
+            self.mid_boss_spawned, self.mid_boss_defeated,
+            self.final_stage, self.final_boss_spawned, self.final_boss_defeated,
+        ]
+        for grp in (self.enemies, self.items, self.beams, self.arrows, self.exps,
+                    self.midboss_group, self.beams_tbos, self.meteors,
+                    self.finalboss_group, self.boss_meteors):
+            parts.append(tuple(tuple(spr.rect) for spr in grp))
+        for grp in (self.midboss_group, self.finalboss_group):
+            parts.append(tuple(spr.hp for spr in grp))
+        parts.append(self.barrage.digest())
+        return zlib.crc32(repr(parts).encode("utf-8"))
+
+    def _handle_keydowns(self, keys: tuple[int, ...]) -> None:
+        bird = self.bird
+        for key in keys:
+            if self.game_state == STATE_START:
+                if key == pg.K_RETURN:
+                    self.game_state = STATE_PLAY
+                    self.tmr = 0
+                    bird.hp = HP_MAX
+                    for grp in (self.enemies, self.items, self.beams, self.arrows, self.exps,
+                                self.midboss_group, self.beams_tbos, self.meteors, self.boss_meteors):
+                        grp.empty()
+                    self.barrage.clear()
+                    self.particles.clear()
+                    self.timeline = Timeline(self.params["timeline"], start=self.tmr)
+                    self.mid_boss_spawned = False
+                    self.mid_boss_defeated = False
+
+            elif self.game_state == STATE_PLAY:
+                if key == pg.K_UP:
+                    bird.try_jump()
+                if key == pg.K_ESCAPE:
+                    self.quit_requested = True
+                    return
+                if key == pg.K_SPACE:
+                    atk_id = self.inv.get_attack()
+                    d = bird.get_dir()  # +1 or -1
+
+                    # 発射位置：右向きなら右手、左向きなら左手
+                    if d == +1:
+                        start = (bird.get_rect().right + 30, bird.get_rect().centery)
+                    else:
+                        start = (bird.get_rect().left - 30, bird.get_rect().centery)
+
+                    if atk_id == "Beam":
+                        self.beams.add(Beam.acquire(start, direction=d))
+                    elif atk_id == "arrow":
+                        self.arrows.add(Arrow.acquire(start, direction=d))
+
+    def _step_play(self, inputs: FrameInput) -> None:
+        bird = self.bird
+        enemies, items, beams, arrows, exps = self.enemies, self.items, self.beams, self.arrows, self.exps
+        midboss_group, beams_tbos, meteors = self.midboss_group, self.beams_tbos, self.meteors
+        finalboss_group, boss_meteors = self.finalboss_group, self.boss_meteors
+        prof = self.profiler
+
+        # 背景
+        self.bg.update()
+
+        # --- 更新 ---
+        bird.update(inputs.pressed)
+        prof.lap("bird")
+        enemies.update()
+        items.update()
+        beams.update()
+        arrows.update()
+        exps.update()
+        self.particles.update()
+        boss_meteors.update()
+        prof.lap("groups")
+
+        # --- 敵スポーン・ボス出現・アイテムスポーン（ステージファイルの予定表で、時刻が来たものだけ）---
+        self.timeline.run(self.tmr, self._on_stage_event, self._stage_gate)
+        prof.lap("spawn")
+
+        # 中ボス更新
+        if self.mid_boss_spawned and len(midboss_group.sprites()) > 0:
+            midboss_group.update(bird.get_rect(), beams_tbos, meteors, self.barrage, inputs.meteor_cap)
+            beams_tbos.update()
+            meteors.update()
+        self.barrage.update()
+        prof.lap("boss_update")
+
+        # --- 当たり判定（ここから先は移動しないグループを空間ハッシュで引く）---
+        world = self.world
+        world.begin_frame()
+
+        # --- 当たり判定：攻撃 → 敵 ---
+        hit1 = world.groupcollide(enemies, beams, True, True)
+        for emy in hit1.keys():
+            exps.add(Explosion.acquire(emy.rect.center, life=30))
+            self.particles.burst(emy.rect.center, PARTICLE_BURST)
+            self.score += random.randint(10, 20)
+
+        hit2 = world.groupcollide(enemies, arrows, True, True)
+        for emy in hit2.keys():
+            exps.add(Explosion.acquire(emy.rect.center, life=30))
+            self.particles.burst(emy.rect.center, PARTICLE_BURST)
+            self.score += random.randint(10, 20)
+        prof.lap("hit_attacks")
+
+        # --- 当たり判定：アイテム取得 ---
+        picked = world.spritecollide(bird, items, True)
+        for it in picked:
+            item_id = it.get_item_id()
+            cat = self.item_defs[item_id].get_category()
+            if cat == "attack":
+                self.inv.pickup_attack(item_id)
+            else:
+                apply_status_pickup(item_id, self.inv, bird)
+        prof.lap("hit_items")
+
+        # --- 当たり判定：敵接触ダメージ（HPはbirdに統一）---
+        if world.spritecollide(bird, enemies, False):
+            bird.take_damage(DMG)
+            bird.set_damage()  # 点滅
+            # 接触してる敵は消す（好みで）
+            for e in world.spritecollide(bird, enemies, True):
+                pass
+
+        # --- 当たり判定：中ボス攻撃物 ---
+        if world.spritecollide(bird, beams_tbos, True):
+            bird.take_damage(DMG)
+            bird.set_damage()
+        if world.spritecollide(bird, meteors, True):
+            bird.take_damage(DMG)
+            bird.set_damage()
+        if world.spritecollide(bird, boss_meteors, True):
+            bird.take_damage(DMG)
+            bird.set_damage()
+
+        # --- 当たり判定：弾幕（配列のまま一括で判定）---
+        if self.barrage.hit_rect(bird.get_rect()):
+            before = bird.hp
+            bird.take_damage(BARRAGE_DMG)
+            if bird.hp < before:
                 bird.set_damage()
-            if pg.sprite.spritecollide(bird, boss_meteors, True):
+
+        if self.mid_boss_spawned and len(midboss_group.sprites()) > 0:
+            boss = midboss_group.sprites()[0]
+            if bird.get_rect().colliderect(boss.rect):
+                before = bird.hp
+                bird.take_damage(DMG)   # DMG=20.0 なので20ダメージ
+                if bird.hp < before:
+                    bird.set_damage()
+        prof.lap("hit_bird")
+
+        # --- 中ボスに攻撃命中 ---
+        if self.mid_boss_spawned and len(midboss_group.sprites()) > 0:
+            boss = midboss_group.sprites()[0]
+            hit_beams = world.spritecollide(boss, beams, True)
+            if hit_beams:
+                boss.hp -= 100 * len(hit_beams)
+                for spr in hit_beams:
+                    self.particles.burst(spr.rect.center, PARTICLE_SPARK)
+
+            hit_arrows = world.spritecollide(boss, arrows, True)
+            if hit_arrows:
+                boss.hp -= 80 * len(hit_arrows)
+                for spr in hit_arrows:
+                    self.particles.burst(spr.rect.center, PARTICLE_SPARK)
+
+            # 撃破
+            if boss.hp <= 0:
+                exps.add(Explosion.acquire(boss.rect.center, life=60))
+                self.score += 1000
+                self.game_state = STATE_TO_FINAL
+                self.state_timer = 0
+                for grp in (midboss_group, beams_tbos, meteors, enemies, items, beams, arrows, exps):
+                    grp.empty()
+                self.barrage.clear()
+
+                self.mid_boss_spawned = False
+                self.mid_boss_defeated = True
+                self.final_stage = True
+                self.prefetch.start(2)
+        prof.lap("hit_bosses")
+
+        # --- 当たり判定：最終ボス接触（ダメージ + ノックバック）---
+        if self.final_boss_spawned and len(finalboss_group.sprites()) > 0:
+            boss = finalboss_group.sprites()[0]
+
+            if bird.get_rect().colliderect(boss.rect):
+                # ダメージ（無敵中なら take_damage 内で無効化される）
+                before = bird.hp
                 bird.take_damage(DMG)
-                bird.set_damage()
 
-            if mid_boss_spawned and len(midboss_group.sprites()) > 0:
-                boss = midboss_group.sprites()[0]
-                if bird.get_rect().colliderect(boss.rect):
-                    before = bird.hp
-                    bird.take_damage(DMG)   # DMG=20.0 なので20ダメージ
-                    if bird.hp < before:
-                        bird.set_damage()
-
-            # --- 中ボスに攻撃命中 ---
-            if mid_boss_spawned and len(midboss_group.sprites()) > 0:
-                boss = midboss_group.sprites()[0]
-                hit_beams = pg.sprite.spritecollide(boss, beams, True)
-                if hit_beams:
-                    boss.hp -= 100 * len(hit_beams)
-
-                hit_arrows = pg.sprite.spritecollide(boss, arrows, True)
-                if hit_arrows:
-                    boss.hp -= 80 * len(hit_arrows)
-
-                # 撃破
-                if boss.hp <= 0:
-                    exps.add(Explosion(boss.rect.center, life=60))
-                    midboss_group.empty()
-                    beams_tbos.empty()
-                    meteors.empty()
-                    mid_boss_spawned = False
-                    mid_boss_defeated = True
-                    score += 1000
-                    game_state = STATE_TO_FINAL
-                    state_timer = 0
-                    midboss_group.empty()
-                    beams_tbos.empty()
-                    meteors.empty()
-                    enemies.empty()
-                    items.empty()
-                    beams.empty()
-                    arrows.empty()
-                    exps.empty()
-
-                    mid_boss_spawned = False
-                    mid_boss_defeated = True
-                    final_stage = True
-
-            # --- 当たり判定：最終ボス接触（ダメージ + ノックバック）---
-            if final_boss_spawned and len(finalboss_group.sprites()) > 0:
-                boss = finalboss_group.sprites()[0]
-
-                if bird.get_rect().colliderect(boss.rect):
-                    # ダメージ（無敵中なら take_damage 内で無効化される）
-                    before = bird.hp
-                    bird.take_damage(DMG)
-
-                    # 実際にHPが減ったフレームだけ、ノックバックさせる（無敵中の連打防止）
-                    if bird.hp < before:
-                        bird.set_damage()
-
-                        # 押し出し方向：こうかとんがボスの左なら左へ、右なら右へ
-                        if bird.get_rect().centerx < boss.rect.centerx:
-                            bird.rect.right = boss.rect.left - 2
-                            bird.rect.x -= 24      # 横ノックバック量（好みで）
-                        else:
-                            bird.rect.left = boss.rect.right + 2
-                            bird.rect.x += 24
-
-                        # 上にも少し跳ねさせる（ふわっと感）
-                        bird.set_vy(-10)
-
-                        # 画面外に出ないように補正
-                        bird.rect = clamp_in_screen(bird.rect)
-
-            if final_boss_spawned and len(finalboss_group.sprites()) > 0:
-                finalboss_group.update(bird.get_rect(), boss_meteors)
-
-                boss = finalboss_group.sprites()[0]
-
-                hit_beams = pg.sprite.spritecollide(boss, beams, True)
-                if hit_beams:
-                    boss.hp -= 100 * len(hit_beams)
-                    boss.on_hit()
-
-                hit_arrows = pg.sprite.spritecollide(boss, arrows, True)
-                if hit_arrows:
-                    boss.hp -= 80 * len(hit_arrows)
-                    boss.on_hit()
-
-                if boss.hp <= 0:
-                    exps.add(Explosion(boss.rect.center, life=60))
-                    finalboss_group.empty()
-                    final_boss_defeated = True
-                    final_boss_spawned = False
-                    game_state = STATE_CLEAR
-
-            # --- 描画 ---
-            enemies.draw(screen)
-            items.draw(screen)
-            beams.draw(screen)
-            arrows.draw(screen)
-            exps.draw(screen)
-            boss_meteors.draw(screen)
-
-            # --- UI：左下HP ---(担当：佐藤)
-            bar_x, bar_y = 20, HEIGHT - 25
-            bar_w, bar_h = 200, 14
-
-            hp_surf = font.render(f"HP:{bird.hp}", True, (255, 255, 255))
-            hp_pos = (bar_x, bar_y - hp_surf.get_height() - 6)  # ← ゲージの上に6px余白
-            screen.blit(hp_surf, hp_pos)
-
-            pg.draw.rect(screen, (255, 255, 255), (bar_x, bar_y, bar_w, bar_h))
-            ratio = max(0.0, min(1.0, bird.hp / HP_MAX))
-            pg.draw.rect(screen, (0, 200, 0), (bar_x, bar_y, int(bar_w * ratio), bar_h))
-
-            # --- UI：右上Score（縁取り）---(担当：佐藤)
-            if score != last_score:
-                last_score = score
-                score_str = f"Score:{score}"
-                score_surf = make_outlined_text(font, score_str, (255,255,255), (0,0,0), outline_px=2)
-                score_pos = (WIDTH - score_surf.get_width() - 20, 20)
-
-            screen.blit(score_surf, score_pos)
-
-            # --- UI：右下 Attack/Status ---(担当：佐藤)
-            pg.draw.rect(screen, (0, 0, 0), attack_box)
-            pg.draw.rect(screen, (255, 255, 255), attack_box, 2)
-            pg.draw.rect(screen, (0, 0, 0), status_box)
-            pg.draw.rect(screen, (255, 255, 255), status_box, 2)
-
-            screen.blit(font_ui.render("Attack", True, (255, 255, 255)), (attack_box.x + 10, attack_box.y + 8))
-            screen.blit(font_ui.render("Status", True, (255, 255, 255)), (status_box.x + 10, status_box.y + 8))
-
-            atk_id = inv.get_attack()
-            sta_id = inv.get_status()
-
-            def draw_slot(box, item_id):
-                pad_x = 12
-                top_y = box.y + 34
-                area = pg.Rect(box.x + pad_x, top_y, box.w - pad_x * 2, box.h - (top_y - box.y) - 10)
-                if item_id is None:
-                    screen.blit(font_item.render("-", True, (255, 255, 255)), (area.x, area.y + 10))
-                    return
-                icon = UI_ICONS.get(item_id)
-                icon_y = area.y + (area.h - icon.get_height()) // 2
-                screen.blit(icon, (area.x, icon_y))
-                name_x = area.x + icon.get_width() + 10
-                screen.blit(font_item.render(str(item_id), True, (255, 255, 255)), (name_x, area.y + 10))
-
-            draw_slot(attack_box, atk_id)
-            draw_slot(status_box, sta_id)
-
-            if mid_boss_spawned:
-                midboss_group.draw(screen)
-                beams_tbos.draw(screen)
-                meteors.draw(screen)
-                # 中ボスHP表示
-                if len(midboss_group.sprites()) > 0:
-                    boss = midboss_group.sprites()[0]
-                    hp_txt = font.render(f"HP:{boss.hp}", True, (255, 255, 255))
-                    screen.blit(hp_txt, (boss.rect.centerx - hp_txt.get_width() // 2, boss.rect.top - 30))
-
-            if final_boss_spawned:
-                finalboss_group.draw(screen)
-                # 最終ボスHP表示
-                if len(finalboss_group.sprites()) > 0:
-                    boss = finalboss_group.sprites()[0]
-                    hp_txt = font.render(f"HP:{boss.hp}", True, (255, 255, 255))
-                    screen.blit(hp_txt, (boss.rect.centerx - hp_txt.get_width() // 2, boss.rect.top - 30))
-
-            # --- ゲームオーバー判定 ---
-            if bird.hp <= 0:
-                game_state = STATE_GAMEOVER
-
-            # ★tmrはPLAY中に進める
-            tmr += 1
-
-        elif game_state == STATE_TO_FINAL:
-            draw_to_final_screen(screen)
-            state_timer += 1
-
-            if state_timer >= FINAL_TRANSITION_FRAMES:
-                # ---- 最終ステージへ切り替え（背景＆敵種類変更）----
-                stage = 2  # stage_params(2) を “最終ステージ用” として使う前提
-                params = stage_params(stage)
-                bg = Background(params["bg_file"], params["bg_speed"])
-
-                # ここで地面が変わるので、足元合わせ直し
-                bird.get_rect().bottom = get_ground_y()
-                apply_status_from_current(inv, bird)
-
-                # 最終ボス関連を初期化
-                final_boss_spawned = False
-                final_boss_defeated = False
+                # 実際にHPが減ったフレームだけ、ノックバックさせる（無敵中の連打防止）
+                if bird.hp < before:
+                    bird.set_damage()
+
+                    # 押し出し方向：こうかとんがボスの左なら左へ、右なら右へ
+                    if bird.get_rect().centerx < boss.rect.centerx:
+                        bird.rect.right = boss.rect.left - 2
+                        bird.rect.x -= 24      # 横ノックバック量（好みで）
+                    else:
+                        bird.rect.left = boss.rect.right + 2
+                        bird.rect.x += 24
+
+                    # 上にも少し跳ねさせる（ふわっと感）
+                    bird.set_vy(-10)
+
+                    # 画面外に出ないように補正
+                    bird.rect = clamp_in_screen(bird.rect)
+        prof.lap("hit_finalboss")
+
+        if self.final_boss_spawned and len(finalboss_group.sprites()) > 0:
+            finalboss_group.update(bird.get_rect(), boss_meteors, self.barrage, inputs.meteor_cap)
+            prof.lap("finalboss_update")
+
+            boss = finalboss_group.sprites()[0]
+
+            hit_beams = world.spritecollide(boss, beams, True)
+            if hit_beams:
+                boss.hp -= 100 * len(hit_beams)
+                for spr in hit_beams:
+                    self.particles.burst(spr.rect.center, PARTICLE_SPARK)
+                boss.on_hit()
+
+            hit_arrows = world.spritecollide(boss, arrows, True)
+            if hit_arrows:
+                boss.hp -= 80 * len(hit_arrows)
+                for spr in hit_arrows:
+                    self.particles.burst(spr.rect.center, PARTICLE_SPARK)
+                boss.on_hit()
+
+            if boss.hp <= 0:
+                exps.add(Explosion.acquire(boss.rect.center, life=60))
                 finalboss_group.empty()
+                self.barrage.clear()
+                self.final_boss_defeated = True
+                self.final_boss_spawned = False
+                self.game_state = STATE_CLEAR
+        prof.lap("hit_bosses")
+
+        # --- ゲームオーバー判定 ---
+        if bird.hp <= 0:
+            self.game_state = STATE_GAMEOVER
+
+        # ★tmrはPLAY中に進める
+        self.tmr += 1
+
+    def _stage_gate(self, ev: dict) -> bool:
+        """
+        予定表の "when" の条件。
+        """
+        when = ev["when"]
+        if when == "no_boss":           # モブ敵は中ボス前と最終ボス前だけ
+            return (not self.mid_boss_spawned) and (not self.final_boss_spawned)
+        if when == "midboss_ready":
+            return self.score > MIDBOSS_SCORE and (not self.mid_boss_spawned) and (not self.mid_boss_defeated)
+        if when == "final_boss_ready":  # 最終ステージ中 && Score 1500到達
+            return (self.final_stage and (not self.final_boss_spawned) and (not self.final_boss_defeated)
+                    and self.score >= FINAL_BOSS_SCORE)
+        raise ValueError(f"{STAGE_FILE}: 不明な条件 {when!r}")
+
+    def _on_stage_event(self, ev: dict, now: int) -> None:
+        kind = ev["event"]
+        if kind == "enemy":
+            spawn_enemy(self.enemies, self.stage)
+
+        elif kind == "item":
+            spawn_item(self.stage, self.item_defs, self.items)
+
+        elif kind == "midboss":
+            self.mid_boss_spawned = True
+            self.enemies.empty()
+            self.midboss_group.add(MidBoss())
+
+        elif kind == "final_boss":
+            self.final_boss_spawned = True
+
+            self.enemies.empty()  # モブ消す（要件：出現止まる＋邪魔なら消す）
+            self.beams.empty()
+            self.arrows.empty()
+
+            b = Boss()
+            b.hp = FINAL_BOSS_HP
+            self.finalboss_group.add(b)
 
-                # PLAY に戻す
-                game_state = STATE_PLAY
-                state_timer = 0
+        else:
+            raise ValueError(f"{STAGE_FILE}: 不明なイベント {kind!r}")
+
+    def _step_to_final(self) -> None:
+        self.state_timer += 1
+
+        if self.state_timer >= FINAL_TRANSITION_FRAMES:
+            # ---- 最終ステージへ切り替え（背景＆敵種類変更）----
+            self.stage = 2  # stage_params(2) を “最終ステージ用” として使う前提
+            self.params = stage_params(self.stage)
+            # 遷移画面の間に先読みした背景に差し替えるだけ（無ければここで作る）
+            bg = self.prefetch.take(self.stage)
+            if bg is None:
+                bg = Background(self.params["bg_file"], self.params["bg_speed"],
+                                self.params.get("ground", "flat"))
+            bg.activate()
+            self.bg = bg
+            self.timeline = Timeline(self.params["timeline"], start=self.tmr)
+
+            # ここで地面が変わるので、足元合わせ直し
+            self.bird.get_rect().bottom = get_ground_y(self.bird.get_rect().centerx)
+            apply_status_from_current(self.inv, self.bird)
+
+            # 最終ボス関連を初期化
+            self.final_boss_spawned = False
+            self.final_boss_defeated = False
+            self.finalboss_group.empty()
+
+            # PLAY に戻す
+            self.game_state = STATE_PLAY
+            self.state_timer = 0
+
+        # --- ゲームオーバー判定 ---
+        if self.bird.hp <= 0:
+            self.game_state = STATE_GAMEOVER
+
+        self.tmr += 1
+        self.profiler.lap("spawn")  # ステージ切替（背景の読み込み）はスポーン扱い
 
-            # --- ゲームオーバー判定 ---
-            if bird.hp <= 0:
-                game_state = STATE_GAMEOVER
+# =========================
+# 入力の記録・再生
+# =========================
+REPLAY_VERSION = 2
 
-            tmr += 1
+class InputRecorder:
+    """
+    1フレームごとの入力（←/→の押下とKEYDOWN）と状態チェックサムを JSON Lines で記録する。
 
-        elif game_state == STATE_CLEAR:
-            draw_clear_screen(screen, score)
+    1行目はヘッダ（乱数の種など）、2行目以降が1フレーム1行。
+    """
+    def __init__(self, path: str, seed: int):
+        self._f = open(path, "w", encoding="utf-8")
+        self._frames = 0
+        self._write({"type": "header", "version": REPLAY_VERSION, "seed": seed,
+                     "width": WIDTH, "height": HEIGHT})
+
+    def record(self, inputs: FrameInput, checksum: int) -> None:
+        row = {
+            "f": self._frames,
+            "l": int(inputs.pressed[pg.K_LEFT]),
+            "r": int(inputs.pressed[pg.K_RIGHT]),
+            "k": list(inputs.keydowns),
+            "c": checksum,
+        }
+        if inputs.meteor_cap:
+            row["m"] = inputs.meteor_cap
+        self._write(row)
+        self._frames += 1
+
+    def close(self) -> None:
+        self._f.close()
+
+    def _write(self, obj: dict) -> None:
+        self._f.write(json.dumps(obj, separators=(",", ":")) + "\n")
+
+def load_replay(path: str) -> tuple[dict, list[tuple[FrameInput, int]]]:
+    """
+    記録ファイルを読み、(ヘッダ, [(入力, チェックサム), ...]) を返す。
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or lines[0].get("type") != "header":
+        raise ValueError(f"{path}: ヘッダがありません")
+    header = lines[0]
+    if header.get("version") != REPLAY_VERSION:
+        raise ValueError(f"{path}: 対応していない形式です（version={header.get('version')}）")
+    frames = [(FrameInput(bool(r["l"]), bool(r["r"]), tuple(r["k"]), r.get("m", 0)), r["c"]) for r in lines[1:]]
+    return header, frames
+
+def run_replay(path: str, render: bool = False) -> dict:
+    """
+    記録した入力でゲームを最初から最速（FPS制限なし）で再生する。
 
-        elif game_state == STATE_GAMEOVER:
-            draw_gameover_screen(screen, score)
+    毎フレーム状態チェックサムを比べ、最初にずれたフレーム番号を diverged_at に入れて止まる。
+    render=True なら画面にも描く（pg.display / pg.font の初期化が必要）。
+    """
+    header, frames = load_replay(path)
+    renderer = None
+    presenter = None
+    if render:
+        screen = pg.display.set_mode((header["width"], header["height"]))
+        presenter = FramePresenter()
+
+    t0 = time.perf_counter()
+    sim = GameSim(seed=header["seed"])
+    if render:
+        renderer = GameRenderer(screen, sim, presenter)
+
+    diverged_at = None
+    played = 0
+    try:
+        for i, (inputs, expected) in enumerate(frames):
+            if render:
+                pg.event.pump()
+            sim.step(inputs)
+            played += 1
+            if sim.state_checksum() != expected:
+                diverged_at = i
+                break
+            if renderer is not None:
+                renderer.draw(sim)
+                presenter.present()
+    finally:
+        sim.prefetch.close()
+    elapsed = time.perf_counter() - t0
+    return {
+        "frames": played,
+        "recorded_frames": len(frames),
+        "diverged_at": diverged_at,
+        "elapsed_s": elapsed,
+        "fps": played / elapsed if elapsed > 0 else 0.0,
+    }
+
+# =========================
+# 画面への転送
+# =========================
+class FramePresenter:
+    """
+    1フレーム分の描画結果を画面に出す（pg.display.update）係。
+
+    dirty_rects=True のときは変化した範囲だけを出す:
+    - 静止画面（スタート/遷移/クリア/ゲームオーバー）は内容が変わったときだけ描いて出す
+    - 背景がスクロールするプレイ中は全面が変わるので、1回の全面 update にまとめる
+    dirty_rects=False のときは従来どおり毎フレーム全面を描いて出す。
+    """
+    def __init__(self, dirty_rects: bool = False):
+        self._dirty_rects = dirty_rects
+        self._static_key = None
+        self._full = False
+        self._rects: list[pg.Rect] = []
+
+    def begin_static(self, key: tuple) -> bool:
+        """
+        静止画面を描く前に呼ぶ。描く必要があれば True（描いた内容は全面で出す）。
+        key（画面の種類と表示内容）が前回と同じなら、描き直しも update も省く。
+        """
+        if self._dirty_rects and key == self._static_key:
+            return False
+        self._static_key = key
+        self._full = True
+        return True
+
+    def mark_full(self) -> None:
+        """
+        このフレームは全面が変わった（プレイ中のスクロールなど）。
+        """
+        self._static_key = None
+        self._full = True
+
+    def invalidate(self) -> None:
+        """
+        画面に前の内容が残っている（オーバーレイを消した・縮んだなど）ので、静止画面でも次は描き直させる。
+        """
+        self._static_key = None
+
+    def add(self, rect: pg.Rect) -> None:
+        """
+        このフレームで変化した範囲を追加する。
+        """
+        self._rects.append(pg.Rect(rect))
+
+    def present(self) -> None:
+        if not self._dirty_rects or self._full:
+            pg.display.update()
+        elif self._rects:
+            pg.display.update(self._rects)
+        self._full = False
+        self._rects.clear()
+
+# =========================
+# 固定ステップ
+# =========================
+class FixedStepClock:
+    """
+    シミュレーションを 1/FPS 秒の固定ステップで進めるための時間の貯金（アキュムレータ）。
+
+    advance() は前回からの実時間を貯め、今回の描画の前に回すステップ数を返す。
+    描画が遅い環境では1回に複数ステップ回して実時間に追いつき、速い環境では 0 ステップの回もある。
+    止まった後（ウィンドウのドラッグなど）に追いつくのは max_steps まで（残りは捨てて遅れを諦める）。
+    alpha は貯金の残り（次のステップまでの割合 0..1）で、描画の補間に使う。
+    """
+    def __init__(self, hz: int = FPS, max_steps: int = MAX_CATCHUP_STEPS):
+        self.dt = 1.0 / hz
+        self.max_steps = max_steps
+        self.dropped = 0  # 追いつきを諦めたステップ数（計測用）
+        self._acc = 0.0
+        self._last = None
+
+    def reset(self) -> None:
+        """
+        次の advance() を最初の1回として扱う（読み込み待ちやステージ切り替えの後に呼ぶ）。
+        """
+        self._last = None
+
+    def advance(self, now: float | None = None) -> int:
+        now = time.perf_counter() if now is None else now
+        if self._last is None:
+            self._acc = self.dt  # 最初の1回はすぐ1ステップ進める
+        else:
+            self._acc += now - self._last
+        self._last = now
+        steps = int(self._acc / self.dt)
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            self._acc -= (steps - self.max_steps) * self.dt
+            steps = self.max_steps
+        self._acc -= steps * self.dt
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        return min(1.0, max(0.0, self._acc / self.dt))
+
+class MotionInterpolator:
+    """
+    固定ステップの間を描画で補間する（直前のステップの位置と今の位置の間に描く）。
+
+    ステップの直前に snapshot(sim) で位置を控え、描画中だけ apply(sim, alpha) で rect を
+    補間した位置に動かして restore で戻す。当たり判定やチェックサムには影響しない。
+    """
+    GROUPS = ("enemies", "items", "beams", "arrows", "exps", "boss_meteors",
+              "midboss_group", "beams_tbos", "meteors", "finalboss_group")
+
+    def __init__(self):
+        self._prev: dict[pg.sprite.Sprite, tuple[int, int]] = {}
+
+    def _sprites(self, sim: "GameSim"):
+        yield sim.bird
+        for name in self.GROUPS:
+            yield from getattr(sim, name)
+
+    def snapshot(self, sim: "GameSim") -> None:
+        self._prev = {spr: spr.rect.topleft for spr in self._sprites(sim)}
+
+    def apply(self, sim: "GameSim", alpha: float) -> list[tuple[pg.Rect, int, int]]:
+        """
+        rect を補間した位置に動かし、戻すための (rect, x, y) の並びを返す。
+        新しく出たもの・LERP_SNAP_PX 以上動いたものはそのまま。
+        """
+        moved = []
+        if alpha >= 1.0:
+            return moved
+        prev = self._prev
+        for spr in self._sprites(sim):
+            p = prev.get(spr)
+            if p is None:
+                continue
+            rect = spr.rect
+            x, y = rect.topleft
+            dx = x - p[0]
+            dy = y - p[1]
+            if (dx == 0 and dy == 0) or abs(dx) > LERP_SNAP_PX or abs(dy) > LERP_SNAP_PX:
+                continue
+            moved.append((rect, x, y))
+            rect.topleft = (round(p[0] + dx * alpha), round(p[1] + dy * alpha))
+        return moved
+
+    @staticmethod
+    def restore(moved: list[tuple[pg.Rect, int, int]]) -> None:
+        for rect, x, y in moved:
+            rect.topleft = (x, y)
+
+# =========================
+# 描画
+# =========================
+class GameRenderer:
+    """
+    GameSim の状態を読んで画面に描く（状態は書き換えない）。
+
+    internal_size を渡すと、プレイ中のゲーム画面（背景・スプライト・弾幕）はその大きさの
+    Surface に縮小した画像で描き、毎フレーム1回の pg.transform.scale で画面に拡大する
+    （塗る画素数が減るので、描画の転送が重い端末向け）。座標・当たり判定は WIDTH x HEIGHT のまま。
+    HUD とボスのHPは拡大した後に等倍で重ねるので文字はぼけない。
+    """
+    def __init__(self, screen: pg.Surface, sim: GameSim, presenter: FramePresenter,
+                 internal_size: tuple[int, int] | None = None):
+        self._screen = screen
+        self._presenter = presenter
+        self._prof = sim.profiler
+
+        # ---- 内部解像度（画面と同じなら等倍でそのまま描く）----
+        self._world = None
+        if internal_size is not None and tuple(internal_size) != screen.get_size():
+            self._world = pg.Surface(internal_size, 0, screen)  # 画面と同じピクセル形式
+            self._scale = (internal_size[0] / WIDTH, internal_size[1] / HEIGHT)
+            self._small_imgs: dict[tuple, pg.Surface] = {}  # (元の画像, smoothscale か) -> 縮小した画像
+            set_render_size(internal_size)  # 次のステージの背景（先読み）もこの大きさで用意させる
+            sim.bg.prepare_size(internal_size)
+        else:
+            set_render_size(None)  # 同じプロセスの前の実行（ベンチマークの別シナリオなど）の大きさを引き継がない
+
+        # ---- UIアイコン（アイテム画像を流用）----(担当：佐藤)
+        icons = {}
+        for k, idef in sim.item_defs.items():
+            try:
+                icons[k] = load_scaled(idef.get_img_file(), (ICON_SIZE, ICON_SIZE))
+            except:
+                # ファイル不一致の場合はダミー（落とさない）
+                surf = pg.Surface((ICON_SIZE, ICON_SIZE))
+                surf.fill((80, 80, 80))
+                icons[k] = surf
+
+        # ---- HUD（変化したところだけ描き直す）----(担当：佐藤)
+        self._hud = Hud(icons, font_size=32, ui_size=22, item_size=22)
+
+    def draw(self, sim: GameSim, lerp: MotionInterpolator | None = None, alpha: float = 1.0) -> None:
+        """
+        lerp と alpha を渡すと、直前のステップとの間の位置に描く（固定ステップの補間）。
+        """
+        screen = self._screen
+        presenter = self._presenter
+        state = sim.game_state
+
+        # （各画面は自分で全面を塗る/背景で覆うので、ここでの全面クリアは不要）
+        if state == STATE_START:
+            if presenter.begin_static((STATE_START,)):
+                draw_start_screen(screen)
+
+        elif state == STATE_PLAY:
+            presenter.mark_full()
+            moved = lerp.apply(sim, alpha) if lerp is not None else ()
+            try:
+                if self._world is not None:
+                    self._draw_play_scaled(sim, alpha if lerp is not None else 1.0)
+                else:
+                    self._draw_play(sim, alpha if lerp is not None else 1.0)
+            finally:
+                if moved:
+                    lerp.restore(moved)
+
+        elif state == STATE_TO_FINAL:
+            if presenter.begin_static((STATE_TO_FINAL,)):
+                draw_to_final_screen(screen)
+
+        elif state == STATE_CLEAR:
+            if presenter.begin_static((STATE_CLEAR, sim.score)):
+                draw_clear_screen(screen, sim.score)
+
+        elif state == STATE_GAMEOVER:
+            if presenter.begin_static((STATE_GAMEOVER, sim.score)):
+                draw_gameover_screen(screen, sim.score)
+
+    def _draw_play(self, sim: GameSim, alpha: float) -> None:
+        screen = self._screen
+        hud = self._hud
+
+        # 背景 & 地面
+        sim.bg.draw(screen, alpha)
+        if DEBUG_DRAW_GROUND_LINE and quality("ground_line"):
+            draw_ground_line(screen)
+
+        sim.bird.draw(screen)
+        sim.enemies.draw(screen)
+        sim.items.draw(screen)
+        sim.beams.draw(screen)
+        sim.arrows.draw(screen)
+        sim.exps.draw(screen)
+        sim.particles.draw(screen, alpha)
+        sim.boss_meteors.draw(screen)
+        self._prof.lap("draw")
+
+        # --- UI：HP・Score・Attack/Status ---(担当：佐藤)
+        hud.update(sim.bird.hp, sim.score, sim.inv.get_attack(), sim.inv.get_status())
+        hud.draw(screen)
+        self._prof.lap("hud")
+
+        if sim.mid_boss_spawned:
+            sim.midboss_group.draw(screen)
+            sim.beams_tbos.draw(screen)
+            sim.meteors.draw(screen)
+            # 中ボスHP表示
+            if len(sim.midboss_group.sprites()) > 0:
+                hud.draw_boss_hp(screen, sim.midboss_group.sprites()[0])
+
+        if sim.final_boss_spawned:
+            sim.finalboss_group.draw(screen)
+            # 最終ボスHP表示
+            if len(sim.finalboss_group.sprites()) > 0:
+                hud.draw_boss_hp(screen, sim.finalboss_group.sprites()[0])
+        sim.barrage.draw(screen, alpha)
+        self._prof.lap("draw")
+
+    def _draw_play_scaled(self, sim: GameSim, alpha: float) -> None:
+        world = self._world
+        screen = self._screen
+        hud = self._hud
+
+        # ゲーム画面は内部解像度で（重なり順は _draw_play と同じ）
+        sim.bg.draw(world, alpha)
+        sprites = [sim.bird] if sim.bird.is_visible() else []
+        for grp in (sim.enemies, sim.items, sim.beams, sim.arrows, sim.exps, sim.boss_meteors):
+            sprites += grp.sprites()
+        if sim.mid_boss_spawned:
+            for grp in (sim.midboss_group, sim.beams_tbos, sim.meteors):
+                sprites += grp.sprites()
+        if sim.final_boss_spawned:
+            sprites += sim.finalboss_group.sprites()
+        self._blit_small(world, sprites)
+        sim.particles.draw(world, alpha, self._scale)
+        sim.barrage.draw(world, alpha, self._scale)
+
+        # 1回で画面の大きさに拡大する
+        pg.transform.scale(world, screen.get_size(), screen)
+        if DEBUG_DRAW_GROUND_LINE and quality("ground_line"):
+            draw_ground_line(screen)
+        self._prof.lap("draw")
+
+        # --- UI：HP・Score・Attack/Status・ボスHP（等倍）---
+        hud.update(sim.bird.hp, sim.score, sim.inv.get_attack(), sim.inv.get_status())
+        hud.draw(screen)
+        if sim.mid_boss_spawned and len(sim.midboss_group.sprites()) > 0:
+            hud.draw_boss_hp(screen, sim.midboss_group.sprites()[0])
+        if sim.final_boss_spawned and len(sim.finalboss_group.sprites()) > 0:
+            hud.draw_boss_hp(screen, sim.finalboss_group.sprites()[0])
+        self._prof.lap("hud")
+
+    def _blit_small(self, dest: pg.Surface, sprites: list[pg.sprite.Sprite]) -> None:
+        """
+        スプライトを内部解像度に縮めた画像と位置で、1回の blits で描く。
+        縮小した画像は元の画像と画質ごとに1回だけ作る（元の画像はキャッシュで共有されている）。
+        """
+        sx, sy = self._scale
+        small = self._small_imgs
+        smooth = quality("smooth_scale")
+        scale = pg.transform.smoothscale if smooth else pg.transform.scale
+        blits = []
+        for spr in sprites:
+            img = spr.image
+            s = small.get((img, smooth))
+            if s is None:
+                w, h = img.get_size()
+                size = (max(1, round(w * sx)), max(1, round(h * sy)))
+                s = small[img, smooth] = scale(img, size)
+            blits.append((s, (int(spr.rect.x * sx), int(spr.rect.y * sy))))
+        dest.blits(blits, doreturn=False)
+
+# =========================
+# 起動
+# =========================
+def init_pygame() -> None:
+    """
+    使うサブシステム（display と font）だけを初期化する。
+    pg.init() は mixer・joystick なども起こすので、使わない分だけ起動が遅くなる。
+    """
+    pg.display.init()
+    pg.font.init()
+
+class StartupTimer:
+    """
+    起動の段階ごとの時間（--startup-timing）。
+
+    mark(name) で前回の mark（最初はモジュールの import 開始）からの時間を name として記録し、
+    report() で一覧の文字列にする。enabled=False なら何もしない。
+    """
+    def __init__(self, enabled: bool = True, t0: float = _IMPORT_T0):
+        self.enabled = enabled
+        self._t0 = t0
+        self._t = t0
+        self._marks: list[tuple[str, float]] = []
+
+    def mark(self, name: str) -> None:
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._marks.append((name, (now - self._t) * 1000.0))
+        self._t = now
+
+    def report(self) -> str:
+        lines = [f"[startup] {name:12s}{ms:9.1f} ms" for name, ms in self._marks]
+        lines.append(f"[startup] {'total':12s}{(self._t - self._t0) * 1000.0:9.1f} ms")
+        return "\n".join(lines)
+
+# =========================
+# メイン
+# =========================
+def main(dirty_rects: bool = False, record: str | None = None, seed: int | None = None,
+         profile_csv: str | None = None, render_fps: int = RENDER_FPS, quality_level: str = "auto",
+         internal_res: tuple[int, int] | None = None, startup: StartupTimer | None = None):
+    startup = startup if startup is not None else StartupTimer(enabled=False)
+    pg.display.set_caption("こうかとんダンジョン")
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    clock = pg.time.Clock()
+    presenter = FramePresenter(dirty_rects=dirty_rects)
+    startup.mark("init")
+
+    # ---- フォント（ファイルの場所はキャッシュから。初回だけ検索する）----
+    resolve_font_path()
+    startup.mark("font")
+
+    # ---- 画像の先読み（スタート画面にバーを出しながら。プレイ中はディスクを読まない）----
+    # ベイク済みのアセットパックがあれば先にそこから取り、足りない分だけ読み込む
+    load_asset_pack()
+    preloader = AssetPreloader(asset_manifest())
+    preloader.start()
+    try:
+        while not preloader.done:
+            if any(event.type == pg.QUIT for event in pg.event.get()):
+                return
+            progress = preloader.poll(timeout=1 / FPS)
+            draw_start_screen(screen)
+            draw_loading_bar(screen, progress)
+            pg.display.update()
+    finally:
+        preloader.close()
+    startup.mark("assets")
+
+    profiler = FrameProfiler(csv_path=profile_csv)
+    overlay = ProfilerOverlay()
+    overlay_rect = None
+    sim = GameSim(seed=seed, profiler=profiler)
+    renderer = GameRenderer(screen, sim, presenter, internal_size=internal_res)
+    recorder = InputRecorder(record, sim.seed) if record else None
+
+    # ---- 固定ステップ：シミュレーションは 1/FPS 秒ずつ、描画は render_fps まで補間して ----
+    # （画像の先読みを待った時間は数えない。作るのは待ちが終わった後）
+    stepper = FixedStepClock()
+    lerp = MotionInterpolator()
+
+    # ---- 画質：auto なら処理時間を見て上げ下げ、名前を指定したらその画質で固定 ----
+    names = [q["name"] for q in QUALITY_LEVELS]
+    governor = QualityGovernor(level=0 if quality_level == "auto" else names.index(quality_level),
+                               auto=quality_level == "auto", log=lambda msg: print(msg, flush=True))
+    pending_keys: tuple[int, ...] = ()  # まだステップに渡していない KEYDOWN（0 ステップの回の分）
+
+    try:
+        while True:
+            frame_t0 = time.perf_counter()
+            profiler.begin_frame()
+            key_lst = pg.key.get_pressed()
+            events = pg.event.get()
+            if any(event.type == pg.QUIT for event in events):
+                return
+            if any(event.type == pg.KEYDOWN and event.key == pg.K_F3 for event in events):
+                overlay.toggle()
+                presenter.invalidate()  # 消したオーバーレイの跡を残さない
+
+            held = FrameInput.from_pygame(key_lst, events)
+            pending_keys += held.keydowns
+            stage = sim.stage
+            for _ in range(stepper.advance()):
+                # 押されたキーは最初のステップにだけ、押しっぱなしのキーは毎ステップ渡す
+                inputs = FrameInput(held.pressed[pg.K_LEFT], held.pressed[pg.K_RIGHT], pending_keys,
+                                    governor.setting("meteor_cap"))
+                pending_keys = ()
+                lerp.snapshot(sim)
+                sim.step(inputs)
+                if recorder is not None:
+                    recorder.record(inputs, sim.state_checksum())
+                if sim.quit_requested:
+                    return
+            if sim.stage != stage:
+                # 背景の切り替え（先読みの待ち）で止まった分は追いつかずに捨てる
+                stepper.reset()
+
+            renderer.draw(sim, lerp, stepper.alpha)
+            prev_overlay_rect, overlay_rect = overlay_rect, overlay.draw(screen, profiler)
+            if overlay_rect is not None:
+                presenter.add(overlay_rect)
+                if prev_overlay_rect is not None and not overlay_rect.contains(prev_overlay_rect):
+                    presenter.invalidate()  # 狭くなった分の古い表示は次のフレームで消す
+            profiler.lap("draw")
+            presenter.present()
+            profiler.lap("present")
+            if startup.enabled:
+                startup.mark("first_frame")
+                print(startup.report(), flush=True)
+                startup.enabled = False
+            governor.observe((time.perf_counter() - frame_t0) * 1000.0)
+            clock.tick(render_fps)
+            profiler.lap("idle")
+            profiler.end_frame(sim.entity_counts())
+    finally:
+        sim.prefetch.close()
+        profiler.close()
+        if recorder is not None:
+            recorder.close()
+
+def _parse_size(text: str) -> tuple[int, int]:
+    """
+    "550x325" を (550, 325) にする（argparse の type 用）。
+    """
+    try:
+        w, h = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"幅x高さ の形で指定してください: {text}")
+    if not (0 < w <= WIDTH and 0 < h <= HEIGHT):
+        raise argparse.ArgumentTypeError(f"1x1 〜 {WIDTH}x{HEIGHT} の範囲で指定してください: {text}")
+    return w, h
+
+def parse_args(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="こうかとんダンジョン")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="変化した範囲だけ画面に転送する（静止画面では再描画もしない）")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="乱数の種（同じ種と同じ入力なら同じ展開になる）")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="プレイ中の入力と状態チェックサムを PATH に記録する")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="記録した入力を最速で再生し、状態のずれを検査する")
+    parser.add_argument("--no-render", action="store_true",
+                        help="--replay 時に画面を描かない")
+    parser.add_argument("--profile-csv", metavar="PATH", default=None,
+                        help="フェーズ別のフレーム時間とグループ別の数を毎フレーム PATH に CSV で書き出す")
+    parser.add_argument("--render-fps", type=int, default=RENDER_FPS,
+                        help=f"描画の上限（0 で制限なし）。ゲームの進みは常に {FPS} ステップ/秒")
+    parser.add_argument("--quality", default="auto", choices=["auto"] + [q["name"] for q in QUALITY_LEVELS],
+                        help="画質（auto は処理時間を見て自動で上げ下げし、切り替えを標準出力に出す）")
+    parser.add_argument("--internal-res", metavar="WxH", type=_parse_size, default=None,
+                        help=f"ゲーム画面をこの解像度で描いて {WIDTH}x{HEIGHT} に拡大する（例: 550x325, 733x433）")
+    parser.add_argument("--startup-timing", action="store_true",
+                        help="起動の段階（import・初期化・フォント・画像・最初のフレーム）ごとの時間を表示する")
+    parser.add_argument("--bake-assets", action="store_true",
+                        help=f"使う画像を最終サイズに変換して {ASSET_PACK_FILE} にまとめる（起動が速くなる）")
+    return parser.parse_args(argv)
 
-        pg.display.update()
-        clock.tick(FPS)
 if __name__ == "__main__":
-    pg.init()
-    main()
+    startup = StartupTimer()
+    startup.mark("import")
+    args = parse_args()
+    startup.enabled = args.startup_timing
+    if args.replay:
+        if args.no_render:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        init_pygame()
+        result = run_replay(args.replay, render=not args.no_render)
+        pg.quit()
+        print(json.dumps(result, ensure_ascii=False))
+        if result["diverged_at"] is not None:
+            raise SystemExit(f"フレーム {result['diverged_at']} で記録と状態がずれました")
+        raise SystemExit(0)
+    if args.bake_assets:
+        init_pygame()
+        pg.display.set_mode((1, 1), pg.HIDDEN)  # 画面と同じピクセル形式で変換するため
+        n, size = bake_asset_pack()
+        pg.quit()
+        print(f"{ASSET_PACK_FILE}: {n} 画像, {size / 1e6:.1f} MB")
+        raise SystemExit(0)
+    init_pygame()
+    main(dirty_rects=args.dirty_rects, record=args.record, seed=args.seed,
+         profile_csv=args.profile_csv, render_fps=args.render_fps, quality_level=args.quality,
+         internal_res=args.internal_res, startup=startup)
     pg.quit()
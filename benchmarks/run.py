@@ -0,0 +1,333 @@
+"""
+シナリオ別のフレーム時間ベンチマーク。
+
+実際のクラス（GameSim / Enemy / Arrow / MidBoss / Boss ...）でシナリオを回し、
+1フレームあたりの時間の p50/p95/p99 と、スプライトが増えたフレームの最大時間
+（生成時の引っかかり）を JSON に書き出す。チェックイン済みの baseline.json と比べ、
+p50/p95 が許容幅を超えて遅くなったシナリオがあれば終了コード1で失敗する。
+
+    python benchmarks/run.py                    # 計測して baseline と比較
+    python benchmarks/run.py --update-baseline  # 今回の結果を baseline にする
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pygame as pg  # noqa: E402
+import Dungeon as D  # noqa: E402  （import 時に作業ディレクトリがリポジトリ直下になる）
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUT = os.path.join(BENCH_DIR, "results.json")
+
+# 比較に使う指標（小さいほど良い）
+# p99/max は数フレームの外れ値で大きく揺れるので表示・記録のみ
+COMPARED_METRICS = ("p50_ms", "p95_ms")
+
+
+def percentile(sorted_vals: list[float], q: float) -> float:
+    """
+    昇順に並んだ値の q パーセンタイル（最近傍順位法）。
+    """
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(q / 100 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def measure(step, count, frames: int) -> dict:
+    """
+    step(i) を frames 回呼んで時間を測る。count() はその時点の生存スプライト数。
+    """
+    times = []
+    hitch = 0.0
+    for i in range(frames):
+        before = count()
+        t0 = time.perf_counter()
+        step(i)
+        dt = (time.perf_counter() - t0) * 1000.0
+        times.append(dt)
+        if count() > before:
+            hitch = max(hitch, dt)
+    s = sorted(times)
+    return {
+        "frames": frames,
+        "p50_ms": round(percentile(s, 50), 4),
+        "p95_ms": round(percentile(s, 95), 4),
+        "p99_ms": round(percentile(s, 99), 4),
+        "max_ms": round(s[-1], 4),
+        "spawn_hitch_max_ms": round(hitch, 4),
+    }
+
+
+def _sim_count(sim: D.GameSim):
+    groups = (sim.enemies, sim.items, sim.beams, sim.arrows, sim.exps, sim.midboss_group,
+              sim.beams_tbos, sim.meteors, sim.finalboss_group, sim.boss_meteors)
+    return lambda: sum(len(g) for g in groups) + len(sim.barrage)
+
+
+_SIMS: list[D.GameSim] = []  # シナリオで作った GameSim（終わったら先読みスレッドを止める）
+
+
+def _start_sim(seed: int) -> D.GameSim:
+    sim = D.GameSim(seed=seed)
+    _SIMS.append(sim)
+    sim.step(D.FrameInput(keydowns=(pg.K_RETURN,)))
+    return sim
+
+
+def _autoplay(i: int) -> D.FrameInput:
+    keys = []
+    if i % 30 == 0:
+        keys.append(pg.K_UP)
+    if i % 8 == 0:
+        keys.append(pg.K_SPACE)
+    return D.FrameInput(right=(i // 120) % 2 == 0, left=(i // 120) % 2 == 1, keydowns=tuple(keys))
+
+
+def _sim_frame(sim: D.GameSim, renderer: D.GameRenderer):
+    def step(i):
+        sim.step(_autoplay(i))
+        sim.bird.hp = D.HP_MAX  # シナリオ途中でゲームオーバーにしない
+        renderer.draw(sim)
+    return step
+
+
+# ----- シナリオ -----
+
+def scenario_stage1_mobs(screen, frames):
+    """ステージ1：モブ敵とアイテムが流れてくる通常プレイ"""
+    sim = _start_sim(seed=1)
+    sim.inv.pickup_attack("Beam")
+    renderer = D.GameRenderer(screen, sim, D.FramePresenter())
+    return measure(_sim_frame(sim, renderer), _sim_count(sim), frames)
+
+
+def scenario_midboss_barrage(screen, frames, internal_size=None):
+    """中ボス戦：通常の攻撃に加えて隕石とビームを3フレームごとに追加で撃たせる"""
+    sim = _start_sim(seed=2)
+    sim.inv.pickup_attack("arrow")
+    sim.score = 300
+    renderer = D.GameRenderer(screen, sim, D.FramePresenter(), internal_size=internal_size)
+    base = _sim_frame(sim, renderer)
+
+    def step(i):
+        for boss in sim.midboss_group:
+            boss.hp = 1500
+            if i % 3 == 0:
+                sim.meteors.add(D.Meteor.acquire(sim.bird.rect.centerx))
+                sim.beams_tbos.add(D.Beam_tbos.acquire(boss.rect.center))
+        base(i)
+    return measure(step, _sim_count(sim), frames)
+
+
+def scenario_midboss_barrage_550x325(screen, frames):
+    """中ボス戦（midboss_barrage と同じ）を内部解像度 550x325 で描いて拡大する"""
+    return scenario_midboss_barrage(screen, frames, internal_size=(550, 325))
+
+
+def scenario_boss_side_meteors(screen, frames):
+    """最終ボス戦：SideMeteor を5フレームごとに撃たせる"""
+    sim = _start_sim(seed=3)
+    sim.inv.pickup_attack("Beam")
+    sim.mid_boss_defeated = True
+    sim.final_stage = True
+    sim.stage = 2
+    sim.params = D.stage_params(2)
+    sim.timeline = D.Timeline(sim.params["timeline"], start=sim.tmr)
+    sim.score = D.FINAL_BOSS_SCORE
+    renderer = D.GameRenderer(screen, sim, D.FramePresenter())
+    base = _sim_frame(sim, renderer)
+    fast = [dict(ev, every=5) if ev["event"] == "side_meteor" else ev for ev in D.boss_pattern("boss")]
+    patched = set()
+
+    def step(i):
+        for boss in sim.finalboss_group:
+            boss.hp = D.FINAL_BOSS_HP
+            if boss not in patched:
+                boss._attacks = D.Timeline(fast, start=boss._shot_tmr)
+                patched.add(boss)
+        base(i)
+    return measure(step, _sim_count(sim), frames)
+
+
+def scenario_enemies_500(screen, frames):
+    """モブ敵500体が同時に存在し、ビームとの当たり判定と描画を行う"""
+    enemies = pg.sprite.Group()
+    beams = pg.sprite.Group()
+    world = D.CollisionWorld()
+
+    def step(i):
+        while len(enemies) < 500:
+            e = D.Enemy.acquire(stage=1 + (len(enemies) % 2), kind=("ground", "air")[len(enemies) % 2], speed=5)
+            e.rect.left = D.WIDTH - (len(enemies) * 7) % (D.WIDTH + 40)
+            enemies.add(e)
+        if i % 4 == 0:
+            beams.add(D.Beam.acquire((100, D.get_ground_y() - 40 - (i % 200)), +1))
+        enemies.update()
+        beams.update()
+        world.begin_frame()
+        world.groupcollide(enemies, beams, True, True)
+        enemies.draw(screen)
+        beams.draw(screen)
+    return measure(step, lambda: len(enemies) + len(beams), frames)
+
+
+def scenario_arrows_200(screen, frames):
+    """矢200本が同時に飛んでいる（落ちたぶんはすぐ撃ち直す）"""
+    arrows = pg.sprite.Group()
+    gy = D.get_ground_y()
+
+    def step(i):
+        while len(arrows) < 200:
+            n = len(arrows)
+            arrows.add(D.Arrow.acquire((100 + (n * 5) % 900, gy - 60 - (n % 40)), +1 if n % 2 else -1))
+        arrows.update()
+        arrows.draw(screen)
+    return measure(step, lambda: len(arrows), frames)
+
+
+def scenario_barrage_5000(screen, frames):
+    """弾幕の弾5000発が同時に存在し、移動・画面外の削除・こうかとんとの判定・描画を行う"""
+    field = D.ProjectileField()
+    bird_rect = pg.Rect(200, D.get_ground_y() - 80, 80, 80)
+    center = (D.WIDTH // 2, D.HEIGHT // 2)
+
+    def step(i):
+        while len(field) < 5000:
+            field.emit_ring(center, 50, 1.0 + (len(field) % 7) * 0.3, len(field) * 3.7,
+                            size_idx=len(field) % len(D.BARRAGE_SIZES))
+        field.update()
+        field.hit_rect(bird_rect)
+        field.draw(screen)
+    return measure(step, lambda: len(field), frames)
+
+
+def scenario_explosion_waves(screen, frames):
+    """モブ敵が10体ずつ4フレームごとに倒れ続ける（爆発アニメと破片の更新・描画）"""
+    exps = pg.sprite.Group()
+    particles = D.ParticleField(seed=1)
+
+    def step(i):
+        if i % 4 == 0:
+            for k in range(10):
+                c = (80 + (i * 37 + k * 101) % (D.WIDTH - 160), 120 + (k * 53) % 360)
+                exps.add(D.Explosion.acquire(c, life=30))
+                particles.burst(c, D.PARTICLE_BURST)
+        exps.update()
+        particles.update()
+        exps.draw(screen)
+        particles.draw(screen)
+    return measure(step, lambda: len(exps) + len(particles), frames)
+
+
+def scenario_background_scroll(screen, frames):
+    """背景のスクロールと描画だけ（1フレームあたりの背景のコスト）"""
+    bg = D.Background(D.stage_params(1)["bg_file"], D.stage_params(1)["bg_speed"])
+
+    def step(i):
+        bg.update()
+        bg.draw(screen)
+    return measure(step, lambda: 0, frames)
+
+
+SCENARIOS = {
+    "stage1_mobs": scenario_stage1_mobs,
+    "midboss_barrage": scenario_midboss_barrage,
+    "midboss_barrage_550x325": scenario_midboss_barrage_550x325,
+    "boss_side_meteors": scenario_boss_side_meteors,
+    "enemies_500": scenario_enemies_500,
+    "arrows_200": scenario_arrows_200,
+    "barrage_5000": scenario_barrage_5000,
+    "explosion_waves": scenario_explosion_waves,
+    "background_scroll": scenario_background_scroll,
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """
+    baseline より (1 + tolerance) 倍、かつ min_delta_ms 以上遅くなった指標を列挙する。
+    （1ms未満の揺れは計測ノイズとして扱う）
+    """
+    failures = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in base:
+                continue
+            limit = max(base[metric] * (1.0 + tolerance), base[metric] + min_delta_ms)
+            if res[metric] > limit:
+                failures.append(f"{name}.{metric}: {res[metric]:.3f}ms > {limit:.3f}ms (baseline {base[metric]:.3f}ms)")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=600, help="シナリオごとのフレーム数")
+    parser.add_argument("--only", nargs="*", choices=sorted(SCENARIOS), help="実行するシナリオ")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="結果JSONの出力先")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="比較に使う baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="baseline からの許容悪化率（0.5 = 1.5倍まで）")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="これ未満の悪化はノイズとして無視する（ms）")
+    parser.add_argument("--update-baseline", action="store_true", help="結果を baseline に書き込む")
+    args = parser.parse_args(argv)
+
+    D.init_pygame()  # ゲーム本体と同じく display と font だけ
+    screen = pg.display.set_mode((D.WIDTH, D.HEIGHT))
+    D.AssetPreloader(D.asset_manifest()).run()  # ゲーム本体と同じく画像は先に読んでおく
+
+    results = {}
+    for name in (args.only or SCENARIOS):
+        results[name] = SCENARIOS[name](screen, args.frames)
+        while _SIMS:
+            _SIMS.pop().prefetch.close()
+        r = results[name]
+        print(f"{name:20s} p50={r['p50_ms']:.3f} p95={r['p95_ms']:.3f} p99={r['p99_ms']:.3f} "
+              f"max={r['max_ms']:.3f} spawn_hitch_max={r['spawn_hitch_max_ms']:.3f} (ms)")
+    pg.quit()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+    if args.update_baseline:
+        # --only で一部だけ測ったときは、そのシナリオだけ差し替える
+        merged = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                merged = json.load(f)
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2)
+            f.write("\n")
+        print(f"baseline を更新しました: {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"baseline がありません: {args.baseline}（--update-baseline で作成）")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    failures = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if failures:
+        print("\n!!! baseline より遅くなりました !!!")
+        for line in failures:
+            print("  " + line)
+        return 1
+    print("baseline の範囲内です")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())